@@ -0,0 +1,349 @@
+"""
+Offline benchmarks for the matching, OMS, tracker and strategy hot paths.
+
+Everything runs on generated orders and SyntheticSource bars, so no
+network is needed. Results are written as JSON (by default to
+benchmarks/benchmark_results.json, which git ignores); pass --compare
+with an earlier results file to flag regressions.
+
+    python benchmarks/run_benchmarks.py --out bench.json
+    python benchmarks/run_benchmarks.py --quick --compare bench.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+from order import CompactOrder, Order, risk_params
+from oms import OrderManagementSystem
+from order_book import LimitOrderBook
+from position_tracker import PositionTracker
+from market_data_loader import MarketDataLoader
+from market_data_sources import SyntheticSource
+from indicators import default_cache
+import strategies.trend_following as trend_following
+import strategies.mean_reversion as mean_reversion
+import strategies.arbitrage as arbitrage
+from streaming_backtest import TrendFollowingStream
+from replay_feed import run_replay
+
+
+# next to this script, whatever directory it is run from
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.json")
+
+
+def _best_of(fn, repeat):
+    """
+    Best wall time of `repeat` runs of fn(), which may return a setup-free
+    timing itself (seconds) or None to be timed from outside.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        inner = fn()
+        elapsed = inner if inner is not None else time.perf_counter() - t0
+        best = min(best, elapsed)
+    return best
+
+
+def _record(results, name, params, n, seconds):
+    results.append({
+        "name":        name,
+        "params":      params,
+        "n":           n,
+        "seconds":     seconds,
+        "ops_per_sec": n / seconds if seconds > 0 else None,
+    })
+    shown = " ".join(f"{k}={v}" for k, v in params.items())
+    print(f"{name:<28} {shown:<36} {seconds * 1e3:10.2f} ms  {n / seconds:14,.0f} /s")
+
+
+def _random_orders(rng, n, mid, market_frac, prefix):
+    sides = rng.choice(["buy", "sell"], n)
+    is_market = rng.random(n) < market_frac
+    offsets = rng.integers(-5, 6, n) * 0.01
+    qtys = rng.integers(1, 101, n)
+    return [
+        Order(id=f"{prefix}{i}", symbol="BENCH", side=sides[i], quantity=int(qtys[i]),
+              type="market" if is_market[i] else "limit",
+              price=None if is_market[i] else round(mid + offsets[i], 2),
+              timestamp=None)
+        for i in range(n)
+    ]
+
+
+def bench_book(results, depths, market_fracs, n, repeat):
+    """
+    add_order throughput on a book pre-loaded with `depth` price levels
+    per side, for several market/limit mixes.
+    """
+    mid = 100.0
+    for depth in depths:
+        for frac in market_fracs:
+            def run():
+                rng = np.random.default_rng(0)
+                book = LimitOrderBook("BENCH")
+                for i in range(depth):
+                    book.add_order(Order(f"b{i}", "BENCH", "buy", 100, "limit",
+                                         round(mid - 0.06 - 0.01 * i, 2), None))
+                    book.add_order(Order(f"a{i}", "BENCH", "sell", 100, "limit",
+                                         round(mid + 0.06 + 0.01 * i, 2), None))
+                orders = _random_orders(rng, n, mid, frac, "o")
+                t0 = time.perf_counter()
+                for order in orders:
+                    book.add_order(order)
+                return time.perf_counter() - t0
+            _record(results, "book.add_order", {"depth": depth, "market_frac": frac},
+                    n, _best_of(run, repeat))
+
+
+def bench_compact_book(results, depths, market_fracs, n, repeat):
+    """
+    bench_book's workload as CompactOrders, on a float-keyed book (which
+    reads each order's price through the price property) and on a tick
+    book (ticks_per_unit=100), which keys and compares levels on the
+    orders' integer price_ticks.
+    """
+    mid = 100.0
+    for depth, frac, ticks in itertools.product(depths, market_fracs, (False, True)):
+        def run():
+            rng = np.random.default_rng(0)
+            book = LimitOrderBook("BENCH",
+                                  ticks_per_unit=CompactOrder.ticks_per_unit if ticks else None)
+            for i in range(depth):
+                book.add_order(CompactOrder(f"b{i}", "BENCH", "buy", 100, "limit",
+                                            9994 - i))
+                book.add_order(CompactOrder(f"a{i}", "BENCH", "sell", 100, "limit",
+                                            10006 + i))
+            orders = [CompactOrder.from_order(order)
+                      for order in _random_orders(rng, n, mid, frac, "o")]
+            t0 = time.perf_counter()
+            for order in orders:
+                book.add_order(order)
+            return time.perf_counter() - t0
+        _record(results, "book.add_order.compact",
+                {"depth": depth, "market_frac": frac, "ticks": ticks},
+                n, _best_of(run, repeat))
+
+
+def bench_stops(results, pending, n, repeat):
+    """
+    update_price cost with `pending` resting stops spread around the mid,
+    on a random walk that triggers a few of them per tick.
+    """
+    mid = 100.0
+    for n_stops in pending:
+        def run():
+            rng = np.random.default_rng(3)
+            book = LimitOrderBook("BENCH")
+            for i in range(n_stops):
+                side = "buy" if i % 2 else "sell"
+                stop = round(mid + (1 if side == "buy" else -1) * rng.uniform(0.5, 50.0), 2)
+                book.add_order(Order(f"s{i}", "BENCH", side, 1, "stop", stop, None))
+            prices = mid + np.cumsum(rng.normal(0, 0.05, n))
+            t0 = time.perf_counter()
+            for price in prices.tolist():
+                book.update_price(price)
+            return time.perf_counter() - t0
+        _record(results, "book.update_price", {"stops": n_stops}, n, _best_of(run, repeat))
+
+
+def bench_oms(results, n, repeat):
+    """
+    new_order and cancel_order rates (no matching engine attached).
+    """
+    timings = {}
+
+    def run():
+        oms = OrderManagementSystem()
+        orders = _random_orders(np.random.default_rng(1), n, 100.0, 0.0, "o")
+        t0 = time.perf_counter()
+        for order in orders:
+            oms.new_order(order)
+        t1 = time.perf_counter()
+        for order in orders:
+            oms.cancel_order(order.id)
+        t2 = time.perf_counter()
+        timings["new"] = min(timings.get("new", np.inf), t1 - t0)
+        timings["cancel"] = min(timings.get("cancel", np.inf), t2 - t1)
+        return 0.0
+
+    _best_of(run, repeat)
+    _record(results, "oms.new_order", {}, n, timings["new"])
+    _record(results, "oms.cancel_order", {}, n, timings["cancel"])
+
+
+def bench_tracker(results, sizes, repeat):
+    """
+    PositionTracker.update throughput and get_pnl_summary cost at several
+    blotter sizes.
+    """
+    symbols = [f"S{i}" for i in range(20)]
+    for n in sizes:
+        rng = np.random.default_rng(2)
+        ts = pd.Timestamp("2024-01-01", tz="UTC")
+        reports = [{
+            "symbol":     symbols[i % len(symbols)],
+            "side":       "buy" if rng.random() < 0.5 else "sell",
+            "filled_qty": int(rng.integers(1, 101)),
+            "price":      float(100 + rng.normal()),
+            "timestamp":  ts,
+        } for i in range(n)]
+        prices = {s: 100.0 for s in symbols}
+        tracker = None
+
+        def run_updates():
+            nonlocal tracker
+            tracker = PositionTracker(starting_cash=1e6)
+            t0 = time.perf_counter()
+            for rpt in reports:
+                tracker.update(rpt)
+            return time.perf_counter() - t0
+        _record(results, "tracker.update", {"blotter": n}, n, _best_of(run_updates, repeat))
+
+        calls = 1000
+        def run_summary():
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                tracker.get_pnl_summary(current_prices=prices)
+            return time.perf_counter() - t0
+        _record(results, "tracker.get_pnl_summary", {"blotter": n}, calls,
+                _best_of(run_summary, repeat))
+
+
+def bench_backtests(results, sizes, modes, repeat):
+    """
+    End-to-end run_backtest wall time per strategy on synthetic bars
+    (history generation is done once per size, outside the timing).
+    """
+    rp = risk_params(order_size=100, order_type="market")
+    for n_bars in sizes:
+        loader = MarketDataLoader("5m", "1mo", source=SyntheticSource(n_bars=n_bars, corr=0.9))
+        loader.get_history_many(["AAA", "BBB"])
+        runs = {
+            "trend_following": lambda mode: trend_following.run_backtest("AAA", loader, rp, mode=mode),
+            "mean_reversion":  lambda mode: mean_reversion.run_backtest("AAA", loader, rp, mode=mode),
+            "arbitrage":       lambda mode: arbitrage.run_backtest("AAA", "BBB", loader, rp, mode=mode),
+        }
+        for name, run in runs.items():
+            for mode in modes:
+                def timed():
+                    # cold indicator cache, so every repeat does the full work
+                    default_cache.clear()
+                    run(mode)
+                _record(results, f"backtest.{name}", {"bars": n_bars, "mode": mode},
+                        n_bars, _best_of(timed, repeat))
+
+
+def bench_replay(results, n_bars, queue_sizes, repeat):
+    """
+    Sustained event rate of the asyncio replay feed into one streaming
+    trend-following consumer (OMS + book + tracker), per queue size.
+    """
+    rp = risk_params(order_size=100, order_type="market")
+    loader = MarketDataLoader("5m", "1mo", source=SyntheticSource(n_bars=n_bars))
+    loader.get_history("AAA")
+    for queue_size in queue_sizes:
+        def run():
+            stats, _ = run_replay([TrendFollowingStream("AAA")], loader, rp, queue_size=queue_size)
+            return stats["feeds"][0]["elapsed_s"]
+        _record(results, "replay.events", {"bars": n_bars, "queue_size": queue_size},
+                n_bars, _best_of(run, repeat))
+
+
+def _key(record):
+    return record["name"] + json.dumps(record["params"], sort_keys=True)
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Print the time ratio against a baseline file for every benchmark in
+    both; return the ones slower by more than `tolerance` x.
+    """
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\ncompared with {baseline_path}:")
+    for record in results:
+        old = baseline.get(_key(record))
+        if old is None:
+            continue
+        ratio = record["seconds"] / old["seconds"]
+        flag = "  REGRESSION" if ratio > tolerance else ""
+        print(f"{_key(record):<70} {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append(record)
+    return regressions
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "created":  datetime.now(timezone.utc).isoformat(),
+        "commit":   commit or None,
+        "python":   platform.python_version(),
+        "numpy":    np.__version__,
+        "pandas":   pd.__version__,
+        "platform": platform.platform(),
+        "cpus":     os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON output path")
+    parser.add_argument("--quick", action="store_true",
+                        help="small sizes only (10k bars, smaller order counts)")
+    parser.add_argument("--bars", type=int, nargs="+", default=None,
+                        help="backtest sizes (default 10000 100000 1000000)")
+    parser.add_argument("--modes", nargs="+", default=["event", "vectorized"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    n_orders = 5_000 if args.quick else 50_000
+    bars = args.bars or ([10_000] if args.quick else [10_000, 100_000, 1_000_000])
+    tracker_sizes = [1_000, 10_000] if args.quick else [1_000, 10_000, 100_000]
+
+    results = []
+    bench_book(results, depths=[0, 100, 1_000, 10_000], market_fracs=[0.0, 0.1, 0.5],
+               n=n_orders, repeat=args.repeat)
+    bench_compact_book(results, depths=[100, 10_000], market_fracs=[0.1],
+                       n=n_orders, repeat=args.repeat)
+    bench_stops(results, pending=[1_000, 100_000], n=n_orders, repeat=args.repeat)
+    bench_oms(results, n=n_orders, repeat=args.repeat)
+    bench_tracker(results, tracker_sizes, repeat=args.repeat)
+    bench_replay(results, n_bars=min(bars), queue_sizes=[1, 64, 1024], repeat=args.repeat)
+    # a single run of the large backtests is plenty
+    bench_backtests(results, bars, args.modes, repeat=1 if max(bars) >= 100_000 else args.repeat)
+
+    with open(args.out, "w") as f:
+        json.dump({"environment": _environment(), "results": results}, f, indent=2)
+    print(f"\nwrote {len(results)} results to {args.out}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
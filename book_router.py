@@ -0,0 +1,246 @@
+"""
+Matching engine that routes orders to one LimitOrderBook per symbol
+"""
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from clock import default_clock
+from order import Order
+from order_book import BarLiquidity, LimitOrderBook
+
+
+class BookRouter:
+    """
+    Owns a LimitOrderBook per symbol, created on first use, and sends
+    add_order/cancel/amend to the right one (cancel and amend find the
+    book through an order id -> symbol map of live orders). Plug it
+    into OrderManagementSystem(matching_engine=...) for multi-symbol flow.
+
+    With workers=0 (default) everything runs in the caller's thread.
+    With workers=N each symbol is pinned to one of N worker threads, each
+    draining a FIFO queue, so orders for one symbol are matched strictly
+    in submission order while different symbols proceed independently:
+
+      - submit(order) queues an order and returns at once; its reports
+        join one merged stream collected with drain()
+      - add_order/cancel/amend go through the same queue and wait for the
+        result, so they stay ordered with anything already submitted
+
+    Under the GIL matching threads interleave rather than run truly in
+    parallel; the per-symbol queues are what keeps ordering correct.
+
+    Books are created with `liquidity` (a BarLiquidity, optional), so
+    set_bar() can drive every symbol from bar data, and `ticks_per_unit`
+    (optional, see LimitOrderBook) for integer-tick price levels.
+
+    An incoming remainder that neither fills nor rests (a market order
+    that runs out of liquidity) gets the book's "canceled" report with
+    filled_qty 0, so consumers of the stream see every order finish.
+    """
+    def __init__(self, clock=None, workers: int = 0,
+                 liquidity: Optional[BarLiquidity] = None,
+                 ticks_per_unit: Optional[int] = None):
+        self.clock = clock or default_clock
+        self.liquidity = liquidity
+        self.ticks_per_unit = ticks_per_unit
+        self._books: Dict[str, LimitOrderBook] = {}
+        self._books_lock = threading.Lock()
+        # order id -> symbol for orders queued or resting in a book
+        self._symbol_of: Dict[str, str] = {}
+        # merged report stream (lists of reports, in completion order)
+        self._out: "queue.SimpleQueue[List[Dict]]" = queue.SimpleQueue()
+        # exceptions raised while matching submitted orders
+        self._errors: List[BaseException] = []
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        for i in range(workers):
+            q = queue.Queue()
+            t = threading.Thread(target=self._work, args=(q,), daemon=True,
+                                 name=f"book-router-{i}")
+            t.start()
+            self._queues.append(q)
+            self._threads.append(t)
+
+    # -- books -------------------------------------------------------------
+
+    def book(self, symbol: str) -> LimitOrderBook:
+        """
+        The symbol's book, created on first use.
+        """
+        book = self._books.get(symbol)
+        if book is None:
+            with self._books_lock:
+                book = self._books.get(symbol)
+                if book is None:
+                    book = self._books[symbol] = LimitOrderBook(
+                        symbol, clock=self.clock, liquidity=self.liquidity,
+                        ticks_per_unit=self.ticks_per_unit)
+        return book
+
+    @property
+    def books(self) -> Dict[str, LimitOrderBook]:
+        return dict(self._books)
+
+    def __contains__(self, order_id) -> bool:
+        """
+        True if the order is resting in one of the books (or still queued
+        for matching).
+        """
+        return order_id in self._symbol_of
+
+    # -- matching (always runs on the symbol's worker, or inline) ---------
+
+    def _add(self, order: Order) -> List[Dict]:
+        book = self.book(order.symbol)
+        reports = book.add_order(order)
+        if order.id not in book:
+            self._symbol_of.pop(order.id, None)
+        return self._forget_done(reports)
+
+    def _forget_done(self, reports: List[Dict]) -> List[Dict]:
+        # resting orders that filled (and triggered stops that filled or
+        # were canceled) are no longer in any book
+        for rpt in reports:
+            if rpt["status"] in ("filled", "canceled"):
+                self._symbol_of.pop(rpt["order_id"], None)
+        return reports
+
+    def _cancel(self, symbol: str, order_id) -> Optional[Order]:
+        self._symbol_of.pop(order_id, None)
+        return self.book(symbol).cancel(order_id)
+
+    def _amend(self, symbol: str, order_id, new_qty, new_price) -> List[Dict]:
+        book = self.book(symbol)
+        reports = book.amend(order_id, new_qty, new_price)
+        if order_id not in book:
+            self._symbol_of.pop(order_id, None)
+        return self._forget_done(reports)
+
+    def _update_price(self, symbol: str, price: float) -> List[Dict]:
+        return self._forget_done(self.book(symbol).update_price(price))
+
+    def _set_bar(self, symbol: str, price: float, volume) -> List[Dict]:
+        return self._forget_done(self.book(symbol).set_bar(price, volume))
+
+    # -- dispatch ----------------------------------------------------------
+
+    def _queue_for(self, symbol: str) -> queue.Queue:
+        return self._queues[zlib.crc32(symbol.encode()) % len(self._queues)]
+
+    def _work(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                fn, args, future = item
+                try:
+                    result = fn(*args)
+                except Exception as exc:
+                    if future is None:
+                        self._errors.append(exc)
+                    else:
+                        future.set_exception(exc)
+                else:
+                    if future is None:
+                        self._out.put(result)
+                    else:
+                        future.set_result(result)
+            finally:
+                q.task_done()
+
+    def _call(self, symbol: str, fn, *args):
+        # run fn on the symbol's worker and wait for it
+        if not self._queues:
+            return fn(*args)
+        future = Future()
+        self._queue_for(symbol).put((fn, args, future))
+        return future.result()
+
+    def add_order(self, order: Order) -> List[Dict]:
+        """
+        Match `order` in its symbol's book and return the reports.
+        """
+        self._symbol_of[order.id] = order.symbol
+        return self._call(order.symbol, self._add, order)
+
+    def submit(self, order: Order) -> None:
+        """
+        Queue `order` for matching; its reports come out of drain().
+        Cancels and amends sent after it are queued behind it.
+        """
+        self._symbol_of[order.id] = order.symbol
+        if not self._queues:
+            self._out.put(self._add(order))
+        else:
+            self._queue_for(order.symbol).put((self._add, (order,), None))
+
+    def cancel(self, order_id) -> Optional[Order]:
+        symbol = self._symbol_of.get(order_id)
+        if symbol is None:
+            return None
+        return self._call(symbol, self._cancel, symbol, order_id)
+
+    def amend(self, order_id, new_qty: Optional[int] = None,
+              new_price: Optional[float] = None) -> List[Dict]:
+        symbol = self._symbol_of.get(order_id)
+        if symbol is None:
+            raise KeyError(f"Order {order_id} is not resting in any book")
+        return self._call(symbol, self._amend, symbol, order_id, new_qty, new_price)
+
+    def update_price(self, symbol: str, price: float) -> List[Dict]:
+        """
+        Pass an outside last price to the symbol's book, triggering its
+        stops (see LimitOrderBook.update_price). Returns their reports.
+        """
+        return self._call(symbol, self._update_price, symbol, price)
+
+    def set_bar(self, symbol: str, price: float, volume: Optional[float] = None) -> List[Dict]:
+        """
+        Start a new bar in the symbol's book (see LimitOrderBook.set_bar).
+        Returns the reports of resting orders and stops it fills.
+        """
+        return self._call(symbol, self._set_bar, symbol, price, volume)
+
+    def flush(self) -> None:
+        """
+        Block until every submitted order has been matched.
+        """
+        for q in self._queues:
+            q.join()
+
+    def drain(self, wait: bool = True) -> List[Dict]:
+        """
+        Reports produced by submit() since the last drain, merged across
+        symbols (per-symbol order preserved). wait=True flushes first.
+        Re-raises the first error hit while matching a submitted order.
+        """
+        if wait:
+            self.flush()
+        if self._errors:
+            raise self._errors.pop(0)
+        reports = []
+        while True:
+            try:
+                reports.extend(self._out.get_nowait())
+            except queue.Empty:
+                return reports
+
+    def close(self) -> None:
+        """
+        Finish queued work and stop the worker threads.
+        """
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join()
+        self._queues, self._threads = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,74 @@
+"""
+Clocks shared by the OMS, order book and position tracker.
+
+Time is kept as integer nanoseconds since the epoch (UTC). now_ns() is
+the cheap call; now() gives a tz-aware UTC datetime for report dicts and
+Order.timestamp (a pd.Timestamp on SimulationClock, built once per bar).
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+
+def to_ns(ts) -> int:
+    """
+    Nanoseconds since epoch for an int, datetime, Timestamp or datetime64.
+    Naive values are taken as UTC.
+    """
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    return pd.Timestamp(ts).value
+
+
+class WallClock:
+    """
+    The real UTC time (the default for every component). now() is a plain
+    datetime (microseconds), several times cheaper to build than a
+    pd.Timestamp on every report.
+    """
+    def now_ns(self) -> int:
+        return time.time_ns()
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+
+class SimulationClock:
+    """
+    Time that only moves when told to: a backtest sets it to each bar's
+    timestamp, so every order, report and blotter row stamped in that bar
+    carries the bar time and runs are deterministic.
+
+    Setting it is an int assignment; the Timestamp for now() is built at
+    most once per distinct instant. Time may not go backwards.
+    """
+    __slots__ = ("_ns", "_ts")
+
+    def __init__(self, start=0):
+        self._ns = to_ns(start)
+        self._ts = None
+
+    def set(self, ts) -> None:
+        ns = to_ns(ts)
+        if ns < self._ns:
+            raise ValueError(f"SimulationClock cannot go back from {self._ns} to {ns}")
+        if ns != self._ns:
+            self._ns = ns
+            self._ts = None
+
+    def advance(self, delta_ns: int) -> None:
+        self.set(self._ns + int(delta_ns))
+
+    def now_ns(self) -> int:
+        return self._ns
+
+    def now(self) -> pd.Timestamp:
+        if self._ts is None:
+            self._ts = pd.Timestamp(self._ns, tz="UTC")
+        return self._ts
+
+
+# used by components that aren't given a clock
+default_clock = WallClock()
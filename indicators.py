@@ -0,0 +1,344 @@
+"""
+Rolling indicators: a memoized prefix-sum cache for whole series and
+online versions for bar-by-bar use
+"""
+import hashlib
+import math
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+def data_version(values):
+    """
+    Fingerprint of a price series: its length and a blake2b digest of its
+    values (and index, for a Series), so an edit anywhere changes it, not
+    just at the tail. O(n), but a fraction of building the prefix sums.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(values, pd.Series):
+        index = values.index
+        digest.update(np.ascontiguousarray(
+            index.asi8 if isinstance(index, pd.DatetimeIndex)
+            else pd.util.hash_array(index.to_numpy())))
+        values = values.to_numpy()
+    values = np.ascontiguousarray(values)
+    digest.update(values.dtype.str.encode())
+    digest.update(values)
+    return (len(values), digest.hexdigest())
+
+
+class _PrefixSums:
+    """
+    Cumulative sum, sum of squares and NaN count of a series (each with a
+    leading 0), after subtracting a constant shift to keep the
+    sum-of-squares well conditioned. Any window's sum is then one
+    subtraction.
+
+    The sums used for the standard deviation are kept in extended
+    precision (np.longdouble), since a window's sum of squares is the
+    difference of two large prefix values and its rounding error grows
+    with the series length; `noise` bounds that error.
+    """
+    __slots__ = ("n", "shift", "s1", "s1_ext", "s2", "noise", "nans")
+
+    def __init__(self, values):
+        x = np.asarray(values, dtype=float).reshape(-1)
+        nan = np.isnan(x)
+        self.shift = float(np.nanmean(x)) if (~nan).any() else 0.0
+        x = np.where(nan, 0.0, x - self.shift)
+        self.n = len(x)
+        self.s1 = np.concatenate(([0.0], np.cumsum(x)))
+        x = x.astype(np.longdouble)
+        self.s1_ext = np.concatenate(([0.0], np.cumsum(x)))
+        self.s2 = np.concatenate(([0.0], np.cumsum(x * x)))
+        self.noise = (4 * np.finfo(np.longdouble).eps * self.s2).astype(float)
+        self.nans = np.concatenate(([0], np.cumsum(nan)))
+
+    def valid(self, window):
+        """
+        Mask of full windows without a NaN, aligned to the window's last
+        bar (length n - window + 1); same alignment for the sums below.
+        """
+        return (self.nans[window:] - self.nans[:-window]) == 0
+
+    def window_sum(self, window):
+        return self.s1[window:] - self.s1[:-window]
+
+    def window_sq_dev(self, window):
+        """
+        Sum of squared deviations from the window mean, with anything
+        inside the rounding bound treated as a flat window (0).
+        """
+        w = window
+        s  = self.s1_ext[w:] - self.s1_ext[:-w]
+        s2 = self.s2[w:] - self.s2[:-w]
+        ss = (s2 - s * s / w).astype(float)
+        return np.where(ss > self.noise[w:], ss, 0.0)
+
+
+class IndicatorCache:
+    """
+    LRU cache of rolling indicators keyed by
+    (symbol, data version, indicator, window).
+
+    The first request for a series builds its prefix sums once; every
+    rolling mean/std after that, for any window, is an O(n) vectorized
+    difference with no re-scan of the window. At most `maxsize` entries
+    (prefix sums and indicator arrays) are kept.
+
+    Results match pandas rolling(window).mean()/.std() (ddof=1,
+    min_periods=window) up to floating point rounding.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, build):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = build()
+        if isinstance(entry, np.ndarray):
+            # shared between callers, so don't let anyone edit it in place
+            entry.flags.writeable = False
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def _check_window(self, window):
+        if int(window) != window or window < 1:
+            raise ValueError(f"window must be a positive integer, got {window!r}")
+
+    def _prefix(self, symbol, values, version):
+        return self._get((symbol, version, "prefix", 0), lambda: _PrefixSums(values))
+
+    def rolling_mean(self, symbol, values, window, version=None):
+        """
+        Rolling mean of `values` over `window` bars (NaN until the window
+        is full or while it contains a NaN). Returns a float array.
+        """
+        self._check_window(window)
+        version = data_version(values) if version is None else version
+
+        def build():
+            p = self._prefix(symbol, values, version)
+            out = np.full(p.n, np.nan)
+            if window <= p.n:
+                mean = p.window_sum(window) / window + p.shift
+                out[window - 1:] = np.where(p.valid(window), mean, np.nan)
+            return out
+        return self._get((symbol, version, "mean", window), build)
+
+    def rolling_std(self, symbol, values, window, version=None):
+        """
+        Rolling sample standard deviation (ddof=1), same NaN rules as
+        rolling_mean. Returns a float array.
+        """
+        self._check_window(window)
+        version = data_version(values) if version is None else version
+
+        def build():
+            p = self._prefix(symbol, values, version)
+            out = np.full(p.n, np.nan)
+            if 1 < window <= p.n:
+                std = np.sqrt(p.window_sq_dev(window) / (window - 1))
+                out[window - 1:] = np.where(p.valid(window), std, np.nan)
+            return out
+        return self._get((symbol, version, "std", window), build)
+
+
+# shared by the strategies (and by each sweep worker process)
+default_cache = IndicatorCache()
+
+
+# ---------------------------------------------------------------------------
+# Online (bar-by-bar) indicators for the streaming engine. Each keeps O(window)
+# state at most and costs O(1) per update.
+
+class RollingMean:
+    """
+    Moving average over the last `window` values, kept as a ring buffer and
+    a running sum. update() returns the current mean (NaN until the window
+    is full or while it holds a NaN), matching rolling(window).mean().
+
+    The running sum is recomputed from the buffer each time the ring wraps,
+    so rounding drift stays bounded at amortized O(1) cost.
+    """
+    __slots__ = ("window", "_buf", "_pos", "_count", "_nans", "_sum")
+
+    def __init__(self, window):
+        if int(window) != window or window < 1:
+            raise ValueError(f"window must be a positive integer, got {window!r}")
+        self.window = int(window)
+        self._buf = [0.0] * self.window
+        self._pos = 0
+        self._count = 0
+        self._nans = 0
+        self._sum = 0.0
+
+    def update(self, x):
+        x = float(x)
+        old = self._buf[self._pos]
+        if self._count == self.window:
+            if old != old:
+                self._nans -= 1
+            else:
+                self._sum -= old
+        else:
+            self._count += 1
+        if x != x:
+            self._nans += 1
+        else:
+            self._sum += x
+        self._buf[self._pos] = x
+        self._pos += 1
+        if self._pos == self.window:
+            self._pos = 0
+            self._sum = math.fsum(v for v in self._buf if v == v)
+        return self.value
+
+    @property
+    def value(self):
+        if self._count < self.window or self._nans:
+            return math.nan
+        return self._sum / self.window
+
+
+class RollingStd:
+    """
+    Sample standard deviation (ddof=1) over the last `window` values via a
+    windowed Welford update: each bar adds the new value and removes the
+    one leaving the window. Same NaN rules as RollingMean; `mean` is the
+    window mean. Mean and M2 are recomputed (two-pass) from the buffer
+    each time the ring wraps.
+    """
+    __slots__ = ("window", "_buf", "_pos", "_count", "_nans", "_n", "_mean", "_m2")
+
+    def __init__(self, window):
+        if int(window) != window or window < 1:
+            raise ValueError(f"window must be a positive integer, got {window!r}")
+        self.window = int(window)
+        self._buf = [0.0] * self.window
+        self._pos = 0
+        self._count = 0
+        self._nans = 0
+        # Welford state over the non-NaN values in the window
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _add(self, x):
+        self._n += 1
+        d = x - self._mean
+        self._mean += d / self._n
+        self._m2 += d * (x - self._mean)
+
+    def _remove(self, x):
+        self._n -= 1
+        if self._n == 0:
+            self._mean = self._m2 = 0.0
+            return
+        d = x - self._mean
+        self._mean -= d / self._n
+        self._m2 -= d * (x - self._mean)
+
+    def update(self, x):
+        x = float(x)
+        old = self._buf[self._pos]
+        if self._count == self.window:
+            if old != old:
+                self._nans -= 1
+            else:
+                self._remove(old)
+        else:
+            self._count += 1
+        if x != x:
+            self._nans += 1
+        else:
+            self._add(x)
+        self._buf[self._pos] = x
+        self._pos += 1
+        if self._pos == self.window:
+            self._pos = 0
+            self._resync()
+        return self.value
+
+    def _resync(self):
+        values = [v for v in self._buf if v == v]
+        self._n = len(values)
+        self._mean = math.fsum(values) / self._n if values else 0.0
+        self._m2 = math.fsum((v - self._mean) ** 2 for v in values)
+
+    @property
+    def mean(self):
+        if self._count < self.window or self._nans:
+            return math.nan
+        return self._mean
+
+    @property
+    def value(self):
+        if self._count < self.window or self._nans or self.window < 2:
+            return math.nan
+        return math.sqrt(max(self._m2, 0.0) / (self.window - 1))
+
+
+class RunningStats:
+    """
+    Expanding mean and sample standard deviation (Welford).
+    """
+    __slots__ = ("n", "mean", "_m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self._m2 += d * (x - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+
+class OnlineOLS:
+    """
+    Expanding least-squares slope of y on x (the hedge ratio
+    np.polyfit(x, y, 1)[0] over every pair seen so far), from running
+    means and co-moments. update() returns the current slope (NaN until
+    x has any variance).
+    """
+    __slots__ = ("n", "_mean_x", "_mean_y", "_sxx", "_sxy")
+
+    def __init__(self):
+        self.n = 0
+        self._mean_x = 0.0
+        self._mean_y = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+
+    def update(self, x, y):
+        self.n += 1
+        dx = x - self._mean_x
+        self._mean_x += dx / self.n
+        self._mean_y += (y - self._mean_y) / self.n
+        self._sxx += dx * (x - self._mean_x)
+        self._sxy += dx * (y - self._mean_y)
+        return self.beta
+
+    @property
+    def beta(self):
+        return self._sxy / self._sxx if self._sxx > 0 else math.nan
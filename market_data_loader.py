@@ -1,89 +1,206 @@
 """
 Market data loader class and methods
 """
+import time
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
 import pandas as pd
 import pytz
+from market_data_store import MarketDataStore
+from market_data_sources import YFinanceSource, normalize_bars, period_to_range
+
 class MarketDataLoader:
-    def __init__(self, interval, period):
+    def __init__(self, interval, period, cache_dir=None, offline=False, source=None):
+        """
+        source:    where bars come from (a market_data_sources.DataSource);
+                   defaults to YFinanceSource. Use FileReplaySource or
+                   SyntheticSource to run without a network.
+        cache_dir: optional directory for a persistent MarketDataStore.
+                   Ranges already on disk are not downloaded again, and
+                   partial overlaps only fetch the missing part (`period`
+                   is the range [now - period, now), so a warm cache only
+                   fetches the bars since the last run).
+        offline:   never touch the network; serve everything from cache_dir.
+        """
         self.interval = interval
         self.period = period
-        #Cache..? ChatGPT suggested
+        self.offline = offline
+        self.source = source if source is not None else YFinanceSource()
+        if offline and cache_dir is None:
+            raise ValueError("offline mode needs a cache_dir to read from")
+        self.store = MarketDataStore(cache_dir) if cache_dir else None
+        # in-memory caches for this session
         self._period_cache = {}
         self._range_cache = {}
+        self._spread_cache = {}
     
     def _rename_and_tx(self, df):
-        #Handle bad call
-        if df.empty:
-             return df
-        #Rename columns
-        df = df.rename(columns={
-            'Open': 'open',
-            'High': 'high',
-            'Low': 'low',
-            'Close': 'last_price',
-            'Volume': 'volume'
-        })
-        if not isinstance(df.index, pd.DatetimeIndex):
-                df.index = pd.to_datetime(df.index)
-        df.index = df.index.tz_localize(None).tz_localize('UTC')
-        return df
+        return normalize_bars(df)
+
+    def _download(self, symbol, start=None, end=None):
+        #The only place that pulls bars from the source
+        return self.source.fetch(symbol, self.interval, start, end, period=self.period)
 
     def _load_period(self, symbol):
-        data = yf.download(symbol, period=self.period, interval=self.interval, auto_adjust=True)
-        data = self._rename_and_tx(data)
+        if symbol in self._period_cache:
+            return self._period_cache[symbol]
+        if self.store is None:
+            data = self._download(symbol)
+        else:
+            data = self._load_stored(symbol, *period_to_range(self.period))
         self._period_cache[symbol] = data
         return data
+
+    def _load_range(self, symbol, start, end):
+        key = (symbol, start, end)
+        if key in self._range_cache:
+            return self._range_cache[key]
+        if self.store is None:
+            data = self._download(symbol, start, end)
+        else:
+            #Open-ended ranges run to the far past/now
+            lo = pd.Timestamp(start) if start is not None else pd.Timestamp('1970-01-01')
+            hi = pd.Timestamp(end) if end is not None else pd.Timestamp.now(tz='UTC')
+            data = self._load_stored(symbol, lo, hi)
+        self._range_cache[key] = data
+        return data
+
+    def _load_stored(self, symbol, lo, hi):
+        #Fetch only the parts of [lo, hi) not on disk yet, then read it all
+        #back from the store
+        if not self.offline:
+            for gap_start, gap_end in self.store.missing(symbol, self.interval, lo, hi):
+                fetched = self._download(symbol, gap_start, gap_end)
+                self.store.write(symbol, self.interval, fetched, gap_start, gap_end)
+        return self.store.read(symbol, self.interval, lo, hi)
+
     def get_history(self, symbol, start=None, end=None): 
         if start or end:
-            data = yf.download(symbol, start=start, end=end, interval=self.interval, auto_adjust=True)
+            data = self._load_range(symbol, start, end)
         else:
             data = self._load_period(symbol)
         return data
 
+    def iter_history(self, symbol, chunk_size=10_000, start=None, end=None):
+        """
+        Yield the symbol's bars in frames of at most chunk_size rows.
+
+        Bars come lazily from the source (SyntheticSource generates them
+        block by block), so the whole history is never held in memory and
+        nothing is added to the session caches. History already loaded this
+        session, or read offline from the memory-mapped store, is sliced
+        instead.
+        """
+        if start or end:
+            data = self._range_cache.get((symbol, start, end))
+        else:
+            data = self._period_cache.get(symbol)
+        if data is None and self.offline:
+            data = self.get_history(symbol, start, end)
+        if data is not None:
+            for i in range(0, len(data), chunk_size):
+                yield data.iloc[i:i + chunk_size]
+            return
+        yield from self.source.iter_chunks(symbol, self.interval, chunk_size,
+                                           start, end, period=self.period)
+
+    def get_history_many(self, symbols, start=None, end=None,
+                         max_workers=8, retries=2, backoff=0.5, align=False):
+        """
+        Load several symbols concurrently on a thread pool (downloads are
+        I/O bound). At most max_workers requests run at once, and each
+        symbol is retried up to `retries` times with exponential backoff.
+
+        Returns {symbol: frame}, or with align=True one wide frame with
+        (symbol, field) columns on the union of all timestamps.
+        Works the same with a local source (FileReplaySource,
+        SyntheticSource) standing in for the network.
+        """
+        def load(symbol):
+            for attempt in range(retries + 1):
+                try:
+                    return self.get_history(symbol, start, end)
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    time.sleep(backoff * 2 ** attempt)
+
+        symbols = list(dict.fromkeys(symbols))
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols)))) as pool:
+            frames = dict(zip(symbols, pool.map(load, symbols)))
+        if align:
+            return pd.concat(frames, axis=1, keys=symbols).sort_index()
+        return frames
+
     def _locate_timestamp(self, df, ts):
-        ts = pd.to_datetime(ts).tz_localize('UTC')
-        if ts in df.index:
-            return ts
-        #Not found, use ffill
-        idx = df.index.get_indexer([ts], method='ffill')[0]
-        return df.index[idx]
-        
+        return df.index[self._locate_positions(df, [ts])[0]]
+
+    def _locate_positions(self, df, timestamps):
+        #Row position of the last bar at or before each timestamp (ffill),
+        #resolved in one searchsorted pass over the sorted index
+        ts = pd.DatetimeIndex(pd.to_datetime(timestamps))
+        ts = ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+        pos = df.index.searchsorted(ts, side='right') - 1
+        if len(pos) and pos.min() < 0:
+            raise KeyError("Timestamp before the start of the loaded history")
+        return pos
+
     def _scalar_to_float(self, x):
         return float(x)
     def _scalar_to_int(self, x):
         return int(x)
 
+    def _spread(self, symbol):
+        """
+        yfinance doesn't provide historic bid ask spreads, so the current
+        quoted spread is fetched once per symbol and reused.
+        """
+        if symbol not in self._spread_cache:
+            if self.offline or not isinstance(self.source, YFinanceSource):
+                #No live quote for cached, replayed or synthetic data
+                spread = 0.0
+            else:
+                quote = yf.Ticker(symbol).info
+                spread = quote.get("ask") - quote.get("bid")
+            self._spread_cache[symbol] = self._scalar_to_float(spread)
+        return self._spread_cache[symbol]
+
     def get_price(self, symbol, timestamp):
         ##############
-        #Only returns the close price of the ticker for one day
+        #Close (last_price) of the bar at or before timestamp, from the
+        #symbol's loaded history
         ##############
-        #Convert timestamp to be a date
-        date_str = timestamp.strftime("%Y-%m-%d")
-        data = yf.download(symbol, start=date_str, interval="1d", auto_adjust=True)
-        return self._scalar_to_float(data.iloc[0,0])
+        return self._scalar_to_float(self.get_prices(symbol, [timestamp])[0])
+
+    def get_prices(self, symbol, timestamps):
+        """
+        Bulk get_price: ffill lookup of many timestamps at once.
+        Returns a float array aligned with timestamps.
+        """
+        history = self.get_history(symbol)
+        pos = self._locate_positions(history, timestamps)
+        return history['last_price'].to_numpy(dtype=float)[pos]
     
     def get_bid_ask(self,symbol, timestamp):
         """
         yfinance doesn't provide historic bid ask spreads.
         This function just guesses what it might have been using the current bid ask spread.
         """
-        #Convert timestamp to be a date
-        date_str = timestamp.strftime("%Y-%m-%d")
-        price = self.get_price(symbol, timestamp)
-        ticker = yf.Ticker(symbol)
-        quote = ticker.info
-        bid = quote.get("bid")
-        ask = quote.get("ask")
-        spread = ask-bid
-        assumed_bid = price-spread
-        assumed_ask = price+spread
-        return (self._scalar_to_float(assumed_bid), self._scalar_to_float(assumed_ask))
+        bids, asks = self.get_bid_asks(symbol, [timestamp])
+        return (self._scalar_to_float(bids[0]), self._scalar_to_float(asks[0]))
+
+    def get_bid_asks(self, symbol, timestamps):
+        """
+        Bulk get_bid_ask: (bids, asks) arrays aligned with timestamps.
+        """
+        prices = self.get_prices(symbol, timestamps)
+        spread = self._spread(symbol)
+        return prices - spread, prices + spread
     
     def get_volume(self, symbol, start, end):
         data = self.get_history(symbol, start, end)
-        volume_sum = data['Volume'].sum()
-        return self._scalar_to_int(volume_sum.iloc[0])
+        volume_sum = data['volume'].sum()
+        return self._scalar_to_int(volume_sum)
     
     def get_option_chain(self, symbol, expiry=None):
         ticker = yf.Ticker(symbol)
@@ -0,0 +1,242 @@
+"""
+Pluggable bar sources for MarketDataLoader.
+
+Every source returns frames in the loader's schema: a UTC DatetimeIndex
+and open/high/low/last_price/volume columns.
+"""
+import os
+import zlib
+import numpy as np
+import pandas as pd
+
+BAR_COLUMNS = ['open', 'high', 'low', 'last_price', 'volume']
+
+# yfinance interval suffix -> pandas offset alias
+_INTERVAL_UNITS = {'m': 'min', 'h': 'h', 'd': 'D', 'wk': 'W', 'mo': 'MS'}
+
+
+def interval_to_offset(interval):
+    """
+    "5m" -> "5min", "1d" -> "1D", "1wk" -> "1W", ...
+    """
+    for suffix in ('wk', 'mo', 'm', 'h', 'd'):
+        if interval.endswith(suffix):
+            return interval[:-len(suffix)] + _INTERVAL_UNITS[suffix]
+    raise ValueError(f"Unknown interval {interval!r}")
+
+
+def period_to_range(period, now=None):
+    """
+    yfinance-style period ("5d", "1wk", "1mo", "2y", "ytd", "max") ->
+    the [start, end) range it covers, ending now.
+    """
+    end = _utc(now) if now is not None else pd.Timestamp.now(tz='UTC')
+    if period == 'max':
+        return pd.Timestamp('1970-01-01', tz='UTC'), end
+    if period == 'ytd':
+        return pd.Timestamp(year=end.year, month=1, day=1, tz='UTC'), end
+    for suffix, unit in (('mo', 'months'), ('wk', 'weeks'), ('y', 'years'), ('d', 'days')):
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return end - pd.DateOffset(**{unit: int(period[:-len(suffix)])}), end
+    raise ValueError(f"Unknown period {period!r}")
+
+
+def normalize_bars(df):
+    """
+    Rename OHLCV columns to the loader schema and put the index in UTC.
+    """
+    #Handle bad call
+    if df.empty:
+        return df
+    #Single-ticker downloads come back with a (field, ticker) column index
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.droplevel(1, axis=1)
+    df = df.rename(columns={
+        'Open': 'open',
+        'High': 'high',
+        'Low': 'low',
+        'Close': 'last_price',
+        'Volume': 'volume'
+    })
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index)
+    df.index = df.index.tz_localize(None).tz_localize('UTC')
+    return df
+
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def _slice(df, start, end):
+    if start is not None:
+        df = df[df.index >= _utc(start)]
+    if end is not None:
+        df = df[df.index < _utc(end)]
+    return df
+
+
+class DataSource:
+    """
+    Interface for bar sources. Subclasses implement fetch(); sources that
+    can produce data lazily also override iter_chunks().
+    """
+    def fetch(self, symbol, interval, start=None, end=None, period=None):
+        """
+        Bars for `symbol` in [start, end), or the source's default span
+        (`period`) when neither is given.
+        """
+        raise NotImplementedError
+
+    def iter_chunks(self, symbol, interval, chunk_size, start=None, end=None, period=None):
+        """
+        Yield the same bars as fetch() in frames of at most chunk_size rows.
+        """
+        df = self.fetch(symbol, interval, start, end, period)
+        for i in range(0, len(df), chunk_size):
+            yield df.iloc[i:i + chunk_size]
+
+
+class YFinanceSource(DataSource):
+    """
+    Downloads from Yahoo Finance (the default source).
+    """
+    def fetch(self, symbol, interval, start=None, end=None, period=None):
+        import yfinance as yf
+        if start is None and end is None:
+            data = yf.download(symbol, period=period, interval=interval, auto_adjust=True)
+        else:
+            data = yf.download(symbol, start=start, end=end, interval=interval, auto_adjust=True)
+        return normalize_bars(data)
+
+
+class FileReplaySource(DataSource):
+    """
+    Replays bars from local CSV or Parquet files.
+
+    `paths` is either a directory holding "<symbol>.csv"/"<symbol>.parquet"
+    files or a {symbol: path} dict. Files may use the loader schema or
+    yfinance's Open/High/Low/Close/Volume names; the first column (or the
+    index, for Parquet) holds the timestamps. The interval is taken as-is
+    from the file.
+    """
+    def __init__(self, paths):
+        self.paths = paths
+        self._frames = {}
+
+    def _path(self, symbol):
+        if isinstance(self.paths, dict):
+            return self.paths[symbol]
+        for ext in ('.parquet', '.csv'):
+            path = os.path.join(self.paths, symbol + ext)
+            if os.path.exists(path):
+                return path
+        raise KeyError(f"No file for {symbol} under {self.paths}")
+
+    def _load(self, symbol):
+        if symbol not in self._frames:
+            path = self._path(symbol)
+            if path.endswith('.parquet'):
+                df = pd.read_parquet(path)
+            else:
+                df = pd.read_csv(path, index_col=0, float_precision='round_trip')
+            self._frames[symbol] = normalize_bars(df).sort_index()
+        return self._frames[symbol]
+
+    def fetch(self, symbol, interval, start=None, end=None, period=None):
+        return _slice(self._load(symbol), start, end)
+
+
+class SyntheticSource(DataSource):
+    """
+    Vectorized geometric Brownian motion bars with volume, for tests and
+    benchmarks at any size without a network.
+
+    Symbols share a common market factor, so any two symbols' returns
+    have correlation `corr`. Each symbol's path is seeded from (seed,
+    symbol) and generated in fixed blocks, so fetch() and iter_chunks()
+    produce identical bars and a symbol's history does not depend on
+    which other symbols were requested.
+    """
+    _BLOCK = 65_536
+
+    def __init__(self, n_bars=10_000, start='2020-01-01', mu=0.05, sigma=0.2,
+                 corr=0.0, start_price=100.0, mean_volume=1e6, seed=0,
+                 bars_per_year=252 * 78):
+        self.n_bars = n_bars
+        self.start = _utc(start)
+        self.mu = mu
+        self.sigma = sigma
+        self.corr = corr
+        self.start_price = start_price
+        self.mean_volume = mean_volume
+        self.seed = seed
+        self.bars_per_year = bars_per_year
+
+    def _span(self, interval, start, end):
+        """
+        (first bar index, bar count) for the requested range.
+        """
+        step = pd.Timedelta(interval_to_offset(interval)) if 'mo' not in interval else None
+        if step is None or (start is None and end is None):
+            return 0, self.n_bars
+        lo = 0 if start is None else max(0, int(np.ceil((_utc(start) - self.start) / step)))
+        hi = self.n_bars if end is None else int(np.ceil((_utc(end) - self.start) / step))
+        return lo, max(0, min(hi, self.n_bars) - lo)
+
+    def _blocks(self, symbol, interval, first, count):
+        """
+        Yield bar frames covering [first, first + count), one block at a time.
+        """
+        offset = pd.tseries.frequencies.to_offset(interval_to_offset(interval))
+        dt = 1.0 / self.bars_per_year
+        drift = (self.mu - 0.5 * self.sigma ** 2) * dt
+        vol = self.sigma * np.sqrt(dt)
+        rho = self.corr
+        sym_key = zlib.crc32(symbol.encode())
+        market = np.random.default_rng([self.seed, 0])
+        own = np.random.default_rng([self.seed, 1, sym_key])
+
+        log_price = np.log(self.start_price)
+        end = first + count
+        for block_start in range(0, end, self._BLOCK):
+            n = min(self._BLOCK, self.n_bars - block_start)
+            if n <= 0:
+                break
+            z = np.sqrt(rho) * market.standard_normal(n) + \
+                np.sqrt(1 - rho) * own.standard_normal(n)
+            log_close = log_price + np.cumsum(drift + vol * z)
+            log_open = np.concatenate(([log_price], log_close[:-1]))
+            log_price = log_close[-1]
+            wick = np.abs(own.standard_normal((2, n))) * vol * 0.5
+            volume = own.lognormal(np.log(self.mean_volume), 0.5, n).round()
+
+            lo = max(first - block_start, 0)
+            hi = min(end - block_start, n)
+            if lo >= hi:
+                continue
+            sl = slice(lo, hi)
+            close, open_ = np.exp(log_close[sl]), np.exp(log_open[sl])
+            index = pd.date_range(self.start + (block_start + lo) * offset,
+                                  periods=hi - lo, freq=offset)
+            yield pd.DataFrame({
+                'open':       open_,
+                'high':       np.maximum(open_, close) * np.exp(wick[0, sl]),
+                'low':        np.minimum(open_, close) * np.exp(-wick[1, sl]),
+                'last_price': close,
+                'volume':     volume[sl],
+            }, index=index)
+
+    def fetch(self, symbol, interval, start=None, end=None, period=None):
+        first, count = self._span(interval, start, end)
+        frames = list(self._blocks(symbol, interval, first, count))
+        if not frames:
+            return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], tz='UTC'))
+        return pd.concat(frames)
+
+    def iter_chunks(self, symbol, interval, chunk_size, start=None, end=None, period=None):
+        first, count = self._span(interval, start, end)
+        for block in self._blocks(symbol, interval, first, count):
+            for i in range(0, len(block), chunk_size):
+                yield block.iloc[i:i + chunk_size]
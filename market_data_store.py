@@ -0,0 +1,118 @@
+"""
+Persistent on-disk cache of bar history for MarketDataLoader
+"""
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional: only needed when a cache_dir is used
+    pa = None
+
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+class MarketDataStore:
+    """
+    One uncompressed Arrow IPC file per (symbol, interval) under `root`.
+
+    Each file records the [start, end) range it covers in its schema
+    metadata, so a request only needs to download the parts of its range
+    that fall outside the covered span. Files are opened memory-mapped,
+    and read() binary-searches the (sorted) timestamp column and slices
+    the Arrow table before converting, so only the requested rows are
+    turned into a DataFrame.
+    """
+    def __init__(self, root):
+        if pa is None:
+            raise ImportError("MarketDataStore requires pyarrow (pip install pyarrow)")
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol, interval):
+        safe = symbol.replace('/', '_').replace('=', '_')
+        return os.path.join(self.root, interval, f"{safe}.arrow")
+
+    def coverage(self, symbol, interval):
+        """
+        (start, end) covered on disk for (symbol, interval), or None.
+        """
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        with pa.memory_map(path) as source:
+            meta = pa.ipc.open_file(source).schema.metadata or {}
+        return (pd.Timestamp(meta[b'coverage_start'].decode()),
+                pd.Timestamp(meta[b'coverage_end'].decode()))
+
+    def missing(self, symbol, interval, start, end):
+        """
+        Sub-ranges of [start, end) that are not on disk yet.
+        Coverage stays contiguous, so a request past the covered span
+        also fetches the gap between them.
+        """
+        start, end = _utc(start), _utc(end)
+        cov = self.coverage(symbol, interval)
+        if cov is None:
+            return [(start, end)]
+        gaps = []
+        if start < cov[0]:
+            gaps.append((start, cov[0]))
+        if end > cov[1]:
+            gaps.append((cov[1], end))
+        return gaps
+
+    def read(self, symbol, interval, start=None, end=None):
+        """
+        Stored bars for (symbol, interval) in [start, end).
+        Raises KeyError if nothing is stored.
+        """
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            raise KeyError(f"No stored data for {symbol} ({interval})")
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            if start is not None or end is not None:
+                # the index is stored as a sorted timestamp column
+                index_col = table.schema.pandas_metadata["index_columns"][0]
+                ts = table.column(index_col).to_numpy().astype("datetime64[ns]", copy=False)
+                lo = 0 if start is None else \
+                    np.searchsorted(ts, np.datetime64(_utc(start).value, "ns"), side="left")
+                hi = len(ts) if end is None else \
+                    np.searchsorted(ts, np.datetime64(_utc(end).value, "ns"), side="left")
+                table = table.slice(lo, max(hi - lo, 0))
+            df = table.to_pandas()
+        return df
+
+    def write(self, symbol, interval, df, start, end):
+        """
+        Merge `df` (which covers [start, end)) into the stored file and
+        widen the recorded coverage. Newly fetched rows win on overlap.
+        """
+        start, end = _utc(start), _utc(end)
+        cov = self.coverage(symbol, interval)
+        if cov is not None:
+            old = self.read(symbol, interval)
+            df = pd.concat([old, df]) if not df.empty else old
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+            start, end = min(start, cov[0]), max(end, cov[1])
+
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'coverage_start': start.isoformat().encode(),
+            b'coverage_end':   end.isoformat().encode(),
+        })
+        path = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so readers never see a half-written file
+        tmp = path + '.tmp'
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
@@ -1,83 +1,286 @@
-from order import Order
-from datetime import datetime
-from typing import Dict, Optional
+from collections import OrderedDict
+from order import Order, OrderType, SIDE_CODES, TYPE_CODES
+from clock import default_clock
+import instrumentation
+from typing import Dict, Iterable, List, Optional
+
+# Orders still able to trade, and final states
+WORKING_STATUSES  = ("accepted", "partial_fill")
+TERMINAL_STATUSES = ("filled", "canceled")
 
 class OrderManagementSystem:
     """
     Validates, tracks, and optionally routes orders.
+    Timestamps come from `clock` (wall clock by default; pass the
+    backtest's SimulationClock to stamp bar time).
+
+    Execution reports (from the matching engine, or passed to
+    process_reports) move orders through
+    accepted -> partial_fill -> filled, or to canceled, and track the
+    remaining quantity. Open orders are indexed by symbol and every
+    order by status, so open_orders()/orders_with_status() cost
+    O(result). Terminal orders move to an archive that keeps only the
+    latest `archive_size`, so memory stays bounded on long runs.
     """
-    def __init__(self, matching_engine=None):
-        # store orders (Order objects) and statuses by order ID
+    def __init__(self, matching_engine=None, clock=None, archive_size=10_000):
+        # open (working) orders and their remaining quantity by order ID
         self._orders: Dict[str, Order]  = {}
+        self._remaining: Dict[str, int] = {}
+        # status of every open or archived order
         self._statuses: Dict[str, str]  = {}
+        # symbol -> open order ids; status -> order ids (dicts as ordered sets)
+        self._by_symbol: Dict[str, Dict[str, None]] = {}
+        self._by_status: Dict[str, Dict[str, None]] = {
+            s: {} for s in WORKING_STATUSES + TERMINAL_STATUSES}
+        # terminal orders, oldest first
+        self._archive: "OrderedDict[str, Order]" = OrderedDict()
+        self.archive_size = archive_size
         # optional matching engine to forward orders
         self.matching_engine = matching_engine
+        self.clock = clock or default_clock
     
     def new_order(self, order: Order) -> dict:
+        t0 = instrumentation.now() if instrumentation.enabled else 0
+        self._accept(order)
+
+        # 4) Forward to matching engine and apply its fills
+        reports = []
+        engine = self.matching_engine
+        if engine:
+            # (a remainder that neither fills nor rests comes back as a
+            # "canceled" report, which closes the order)
+            reports = engine.add_order(order) or []
+            self.process_reports(reports)
+
+        if t0:
+            instrumentation.record("oms.new_order", t0)
+            instrumentation.count("oms.orders")
+
+        # 5) Acknowledge
+        return {
+            "order_id": order.id,
+            "status":   "accepted",
+            "timestamp": order.timestamp,
+            "reports":  reports
+        }
+
+    def submit_order(self, order: Order) -> dict:
+        """
+        Like new_order, but hands the order to the engine's asynchronous
+        submit() (e.g. a threaded BookRouter) without waiting for it to
+        match. Fills are applied when poll() collects them.
+        """
+        self._accept(order)
+        self.matching_engine.submit(order)
+        return {
+            "order_id": order.id,
+            "status":   "accepted",
+            "timestamp": order.timestamp
+        }
+
+    def poll(self, wait: bool = True) -> list:
+        """
+        Collect the engine's merged report stream (see BookRouter.drain),
+        apply it to order state and return it.
+        """
+        reports = self.matching_engine.drain(wait=wait)
+        self.process_reports(reports)
+        return reports
+
+    def _accept(self, order: Order) -> None:
+        """
+        Validate, timestamp and register a new order as accepted.
+        """
         # 1) Basic field checks
-        if order.side not in ("buy", "sell"):
+        # (accepts Order or CompactOrder: string or integer-coded side/type)
+        if order.side not in SIDE_CODES:
             raise ValueError("Side must be 'buy' or 'sell'")
         if order.quantity <= 0:
             raise ValueError("Quantity must be > 0")
-        if order.type not in ("market", "limit", "stop"):
-            raise ValueError("Type must be 'market', 'limit', or 'stop'")
-        if order.type in ("limit", "stop") and order.price is None:
+        if order.type not in TYPE_CODES:
+            raise ValueError("Type must be 'market', 'limit', 'stop' or 'stop_limit'")
+        if TYPE_CODES[order.type] != OrderType.MARKET and order.price is None:
             raise ValueError("Limit/stop orders require a price")
+        if TYPE_CODES[order.type] == OrderType.STOP_LIMIT and \
+                getattr(order, "stop_price", None) is None:
+            raise ValueError("Stop-limit orders require a stop_price")
+        if order.id in self._orders:
+            raise ValueError(f"Order {order.id} is already open")
 
         # 2) Timestamp if missing
-        now = datetime.utcnow()
-        order.timestamp = order.timestamp or now
+        if not order.timestamp:
+            order.timestamp = self.clock.now()
 
         # 3) Save order & status
-        self._orders[order.id]   = order
-        self._statuses[order.id] = "accepted"
+        self._orders[order.id]    = order
+        self._remaining[order.id] = order.quantity
+        self._statuses[order.id]  = "accepted"
+        self._by_status["accepted"][order.id] = None
+        self._by_symbol.setdefault(order.symbol, {})[order.id] = None
 
-        # 4) Forward to matching engine
-        if self.matching_engine:
-            self.matching_engine.add_order(order)
+    def process_report(self, report: dict) -> None:
+        """
+        Apply one execution report. Reports for orders this OMS doesn't
+        hold open (e.g. counterparties submitted elsewhere) are ignored.
+        """
+        order_id = report["order_id"]
+        if order_id not in self._orders:
+            return
+        remaining = self._remaining[order_id] - report.get("filled_qty", 0)
+        self._remaining[order_id] = remaining
+        status = report.get("status")
+        if remaining <= 0:
+            self._close(order_id, "filled")
+        elif status in TERMINAL_STATUSES:
+            self._close(order_id, status)
+        elif status == "partial_fill":
+            self._set_status(order_id, "partial_fill")
+
+    def process_reports(self, reports: Iterable[dict]) -> None:
+        for report in reports:
+            self.process_report(report)
+
+    def _set_status(self, order_id: str, status: str) -> None:
+        old = self._statuses[order_id]
+        if old != status:
+            del self._by_status[old][order_id]
+            self._by_status[status][order_id] = None
+            self._statuses[order_id] = status
+
+    def _close(self, order_id: str, status: str) -> None:
+        """
+        Move an open order to a terminal status and into the archive,
+        evicting the oldest archived order when it is full.
+        """
+        self._set_status(order_id, status)
+        order = self._orders.pop(order_id)
+        del self._remaining[order_id]
+        open_ids = self._by_symbol[order.symbol]
+        del open_ids[order_id]
+        if not open_ids:
+            del self._by_symbol[order.symbol]
+        self._archive[order_id] = order
+        while len(self._archive) > self.archive_size:
+            old_id, _ = self._archive.popitem(last=False)
+            del self._by_status[self._statuses.pop(old_id)][old_id]
+
+    def get_order(self, order_id: str) -> Optional[Order]:
+        """
+        The order, open or archived (None if unknown or evicted).
+        """
+        order = self._orders.get(order_id)
+        return order if order is not None else self._archive.get(order_id)
+
+    def status(self, order_id: str) -> str:
+        if order_id not in self._statuses:
+            raise KeyError(f"Order {order_id} not found")
+        return self._statuses[order_id]
+
+    def remaining(self, order_id: str) -> int:
+        """
+        Unfilled quantity of an order (0 once it is terminal).
+        """
+        if order_id not in self._statuses:
+            raise KeyError(f"Order {order_id} not found")
+        return self._remaining.get(order_id, 0)
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[Order]:
+        """
+        Working (accepted or partially filled) orders, oldest first,
+        optionally for one symbol.
+        """
+        if symbol is not None:
+            return [self._orders[i] for i in self._by_symbol.get(symbol, ())]
+        return [self._orders[i] for i in self._orders]
+
+    def orders_with_status(self, status: str) -> List[Order]:
+        """
+        Orders currently in `status`; for terminal statuses only those
+        still in the archive.
+        """
+        if status not in self._by_status:
+            raise ValueError(f"Unknown status {status!r}")
+        return [self.get_order(i) for i in self._by_status[status]]
 
-        # 5) Acknowledge
-        return {
-            "order_id": order.id,
-            "status":   "accepted",
-            "timestamp": order.timestamp
-        }
     def cancel_order(self, order_id: str) -> dict:
-        if order_id not in self._orders:
+        """
+        Pull an open order off the engine and close it as canceled.
+
+        If the engine no longer has it (e.g. a submit_order() order a
+        BookRouter worker already filled), it is too late: the order stays
+        open, the ack carries its current status instead of "canceled",
+        and the next poll() settles it from the engine's reports.
+        """
+        if order_id not in self._statuses:
             raise KeyError(f"Order {order_id} not found")
         current = self._statuses[order_id]
-        if current in ("canceled", "filled"):
+        if current in TERMINAL_STATUSES:
             raise ValueError(f"Cannot cancel order in status {current}")
-        self._statuses[order_id] = "canceled"
+
+        # pull the order off the book so it can no longer fill
+        engine = self.matching_engine
+        if engine and hasattr(engine, "cancel") and engine.cancel(order_id) is None:
+            return {
+                "order_id": order_id,
+                "status":   current,
+                "timestamp": self.clock.now()
+            }
+        self._close(order_id, "canceled")
+
         return {
             "order_id": order_id,
             "status":   "canceled",
-            "timestamp": datetime.utcnow()
+            "timestamp": self.clock.now()
         }
+
+    def cancel_all(self, symbol: Optional[str] = None, side=None) -> List[dict]:
+        """
+        Cancel every working order, optionally only for one symbol and/or
+        side (e.g. a strategy pulling its resting remainder on the other
+        side before sending a new order, so the two can't trade with
+        each other). Returns the cancel acks.
+        """
+        sign = None if side is None else SIDE_CODES[side]
+        return [self.cancel_order(order.id) for order in self.open_orders(symbol)
+                if sign is None or SIDE_CODES[order.side] == sign]
+
     def amend_order(
         self,
         order_id:   str,
         new_qty:    Optional[int]   = None,
         new_price:  Optional[float] = None
     ) -> dict:
-        if order_id not in self._orders:
+        if order_id not in self._statuses:
             raise KeyError(f"Order {order_id} not found")
-        if self._statuses[order_id] != "accepted":
-            raise ValueError("Only accepted orders can be amended")
+        if self._statuses[order_id] not in WORKING_STATUSES:
+            raise ValueError("Only working orders can be amended")
 
         order = self._orders[order_id]
+        if new_qty is not None and new_qty <= 0:
+            raise ValueError("Quantity must be > 0")
+        if new_price is not None and TYPE_CODES[order.type] == OrderType.MARKET:
+            raise ValueError("Only limit/stop orders can change price")
+
+        # A resting order is amended through the book so it keeps or loses
+        # time priority correctly (and may match if the new price crosses)
+        reports = []
+        engine = self.matching_engine
+        if engine and hasattr(engine, "amend") and order_id in engine:
+            reports = engine.amend(order_id, new_qty, new_price)
+        else:
+            if new_qty is not None:
+                order.quantity = new_qty
+            if new_price is not None:
+                order.price = new_price
+        # new_qty is the new unfilled quantity; fills from a re-queue come off it
         if new_qty is not None:
-            if new_qty <= 0:
-                raise ValueError("Quantity must be > 0")
-            order.quantity = new_qty
-        if new_price is not None:
-            if order.type not in ("limit", "stop"):
-                raise ValueError("Only limit/stop orders can change price")
-            order.price = new_price
-
-        order.timestamp = datetime.utcnow()
+            self._remaining[order_id] = new_qty
+        self.process_reports(reports)
+
+        order.timestamp = self.clock.now()
         return {
             "order_id": order_id,
             "status":   "amended",
-            "timestamp": order.timestamp
-        } 
+            "timestamp": order.timestamp,
+            "reports":  reports
+        }
@@ -1,18 +1,147 @@
 from dataclasses import dataclass
 from datetime import datetime
+from enum import IntEnum
+
+
+class Side(IntEnum):
+    BUY  = 1
+    SELL = -1
+
+
+class OrderType(IntEnum):
+    MARKET = 0
+    LIMIT  = 1
+    STOP   = 2
+    STOP_LIMIT = 3
+
+
+# Accept both the string and the integer-coded spellings.
+# IntEnum members hash like ints, so 1/-1/0/... also resolve.
+SIDE_CODES = {"buy": Side.BUY, "sell": Side.SELL, Side.BUY: Side.BUY, Side.SELL: Side.SELL}
+TYPE_CODES = {
+    "market": OrderType.MARKET, "limit": OrderType.LIMIT, "stop": OrderType.STOP,
+    "stop_limit": OrderType.STOP_LIMIT,
+    OrderType.MARKET: OrderType.MARKET, OrderType.LIMIT: OrderType.LIMIT,
+    OrderType.STOP: OrderType.STOP, OrderType.STOP_LIMIT: OrderType.STOP_LIMIT,
+}
+SIDE_NAMES = {Side.BUY: "buy", Side.SELL: "sell"}
+TYPE_NAMES = {OrderType.MARKET: "market", OrderType.LIMIT: "limit", OrderType.STOP: "stop",
+              OrderType.STOP_LIMIT: "stop_limit"}
+
 
 @dataclass
 class Order:
     """
     Represents a single trade instruction.
     """
-    id:        str        # unique identifier (e.g. UUID or string)
+    id:        str        # unique identifier (e.g. UUID, string or int from OrderIdAllocator)
     symbol:    str        # ticker or asset code (e.g. "AAPL", "EURUSD=X")
     side:      str        # "buy" or "sell"
     quantity:  int        # must be > 0
-    type:      str        # "market", "limit", or "stop"
+    type:      str        # "market", "limit", "stop" or "stop_limit"
     price:     float = None   # limit/stop price, None for market orders
     timestamp: datetime = None  # when the order was created
+    stop_price: float = None  # trigger price of a stop_limit (a stop may use `price`)
+
+
+class OrderIdAllocator:
+    """
+    Monotonic integer order ids. Much cheaper than uuid4 strings to
+    create, hash and compare.
+    """
+    __slots__ = ("_next",)
+
+    def __init__(self, start: int = 1):
+        self._next = start
+
+    def __call__(self) -> int:
+        oid = self._next
+        self._next = oid + 1
+        return oid
+
+
+# process-wide default allocator
+next_order_id = OrderIdAllocator()
+
+
+class CompactOrder:
+    """
+    Slot-based order with integer-coded side/type and integer price ticks.
+
+    Exposes the same attributes as Order (`price` is derived from
+    `price_ticks`), so the OMS and LimitOrderBook accept either.
+    Use from_order()/to_order() to convert at the edges.
+    """
+    __slots__ = ("id", "symbol", "side", "quantity", "type", "price_ticks", "timestamp",
+                 "stop_ticks")
+
+    # ticks per unit of price (100 = one-cent ticks); override on a
+    # subclass for other instruments
+    ticks_per_unit: int = 100
+
+    def __init__(self, id, symbol, side, quantity, type, price_ticks=None, timestamp=None,
+                 stop_ticks=None):
+        self.id          = id
+        self.symbol      = symbol
+        self.side        = SIDE_CODES[side]
+        self.quantity    = quantity
+        self.type        = TYPE_CODES[type]
+        self.price_ticks = price_ticks
+        self.timestamp   = timestamp
+        self.stop_ticks  = stop_ticks
+
+    @property
+    def price(self):
+        return None if self.price_ticks is None else self.price_ticks / self.ticks_per_unit
+
+    @price.setter
+    def price(self, value):
+        self.price_ticks = None if value is None else self.to_ticks(value)
+
+    @property
+    def stop_price(self):
+        return None if self.stop_ticks is None else self.stop_ticks / self.ticks_per_unit
+
+    @stop_price.setter
+    def stop_price(self, value):
+        self.stop_ticks = None if value is None else self.to_ticks(value)
+
+    @classmethod
+    def to_ticks(cls, price: float) -> int:
+        return int(round(price * cls.ticks_per_unit))
+
+    @classmethod
+    def from_order(cls, order: Order, id=None) -> "CompactOrder":
+        """
+        Convert an Order, optionally replacing its id (e.g. with next_order_id()).
+        """
+        return cls(
+            id=order.id if id is None else id,
+            symbol=order.symbol,
+            side=order.side,
+            quantity=order.quantity,
+            type=order.type,
+            price_ticks=None if order.price is None else cls.to_ticks(order.price),
+            timestamp=order.timestamp,
+            stop_ticks=None if order.stop_price is None else cls.to_ticks(order.stop_price)
+        )
+
+    def to_order(self) -> Order:
+        return Order(
+            id=self.id,
+            symbol=self.symbol,
+            side=SIDE_NAMES[self.side],
+            quantity=self.quantity,
+            type=TYPE_NAMES[self.type],
+            price=self.price,
+            timestamp=self.timestamp,
+            stop_price=self.stop_price
+        )
+
+    def __repr__(self):
+        return (f"CompactOrder(id={self.id!r}, symbol={self.symbol!r}, side={self.side.name}, "
+                f"quantity={self.quantity}, type={self.type.name}, price_ticks={self.price_ticks})")
+
 
 @dataclass
 class risk_params:
@@ -1,126 +1,856 @@
-from datetime import datetime
-from typing import List, Dict
-from order import Order
+import heapq
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from order import Order, Side, OrderType, SIDE_CODES, TYPE_CODES
+from clock import default_clock
+import instrumentation
+
+# (resting order, fill quantity, trade price), as produced by matching
+Fill = Tuple[Order, int, float]
+
+# Columnar fill record returned by LimitOrderBook.add_orders
+FILL_DTYPE = np.dtype([
+    ("taker_idx",  np.int64),   # batch position of the incoming order
+    ("maker_idx",  np.int64),   # batch position of the resting order, -1 if older
+    ("side",       np.int8),    # taker side: +1 buy, -1 sell
+    ("filled_qty", np.int64),
+    ("price",      np.float64),
+    ("taker_done", np.bool_),   # fill completed the incoming order
+    ("maker_done", np.bool_),   # fill completed the resting order
+    ("timestamp",  "datetime64[ns]"),
+])
+# FILL_DTYPE minus the timestamp, which is stamped once per batch
+_ROW_DTYPE = np.dtype(FILL_DTYPE.descr[:-1])
+
+# stale heap / queue entries are compacted away once they outnumber the
+# live ones 2:1 (plus this much slack, so small books never bother)
+_COMPACT_SLACK = 16
+
+
+class PriceLevel:
+    """
+    All resting orders at a single price, oldest first.
+
+    `orders` holds (order, level) entries. An entry is live only while
+    the book's order-id index still points at that exact tuple, so a
+    cancel or re-queue just repoints the index and leaves the old entry
+    to be skipped later. `count` is the number of live entries and
+    `quantity` their total remaining size. `key` is what the book sorts
+    and indexes levels by: the price itself, or integer ticks on a tick
+    book.
+    """
+    __slots__ = ("price", "key", "orders", "count", "quantity")
+
+    def __init__(self, price: float, key=None):
+        self.price = price
+        self.key = price if key is None else key
+        self.orders: Deque[Tuple[Order, "PriceLevel"]] = deque()
+        self.count = 0
+        self.quantity = 0
+
+
+@dataclass
+class BarLiquidity:
+    """
+    Liquidity-provider settings for backtesting a book against bar data
+    instead of synthetic counter-orders (see LimitOrderBook.set_bar).
+
+    The provider quotes around the bar price: buyers pay
+    price * (1 + slippage_bps / 1e4) + spread / 2 and sellers get
+    price * (1 - slippage_bps / 1e4) - spread / 2. It fills at most
+    participation * volume shares per bar (no cap if either is None).
+    """
+    spread:        float = 0.0   # full quoted spread, in price units
+    slippage_bps:  float = 0.0   # extra cost per fill, in basis points of price
+    participation: float = None  # max fraction of the bar's volume we may trade
+
 
 class LimitOrderBook:
     """
     A simple price–time priority limit order book.
+
+    Resting orders are grouped into price levels. Each side keeps a
+    dict of price -> PriceLevel plus a heap of level prices, so a new
+    level costs O(log levels) and the best level is always heap[0].
+    Levels that empty out are dropped from the dict and their heap
+    entries are discarded lazily the next time they reach the top. A
+    price is pushed only if it is not already in the heap, and the heap
+    is rebuilt from the live levels once stale entries outnumber live
+    ones 2:1, so cancel/re-quote churn can't grow it without bound.
+
+    Resting orders are also indexed by order id, which makes cancel and
+    reduce O(1): the index entry is dropped or edited in place and the
+    stale queue entry is skipped when matching reaches it (or dropped
+    when the level's queue is compacted, on the same 2:1 rule).
+
+    Stop and stop-limit orders wait off the book until a trade (or an
+    update_price() call) reaches their stop price: a buy stop triggers
+    at or above it, a sell stop at or below. Pending stops sit in one
+    heap per side keyed by stop price, so each trade pops exactly the k
+    stops it crosses in O(k log n) instead of scanning them all. A
+    triggered stop becomes a market order (stop) or a limit order at its
+    `price` (stop_limit) and is matched like any incoming order; its
+    fills can trigger further stops. Cancelled stops are dropped from an
+    id index and skipped lazily in the heap.
+
+    Each level also keeps the total quantity resting on it, updated on
+    insert, fill, cancel and reduce (once per level touched, not per
+    order), so depth(), vwap_for_qty() and snapshot() read levels only
+    and never walk order queues. Levels changed since the last diff()
+    are remembered by price for incremental L2 updates.
+
+    With `liquidity` (a BarLiquidity) the book also trades against the
+    current bar, set with set_bar(price, volume): the bar's quote acts
+    as an extra price level of limited size that incoming orders take
+    whenever it is at least as good as the best resting level, and
+    resting orders it crosses fill at the quote when the bar is set.
+    Provider fills have no resting order and produce only the incoming
+    order's report.
+
+    With `ticks_per_unit` (e.g. 100 for one-cent ticks) levels are keyed
+    and compared on integer ticks instead of float prices. A CompactOrder
+    with the same tick size contributes its price_ticks directly, so it
+    never goes through a float price on the way in; other orders' prices
+    go to the tick on the safe side of their limit (buys down, sells up).
+
+    Fills are stamped from `clock` (wall clock by default).
     """
 
-    def __init__(self, symbol: str):
+    def __init__(self, symbol: str, clock=None, liquidity: Optional[BarLiquidity] = None,
+                 ticks_per_unit: Optional[int] = None):
         self.symbol = symbol
-        # bids: list of resting buy orders, highest price first
-        self.bids: List[Order] = []
-        # asks: list of resting sell orders, lowest price first
-        self.asks: List[Order] = []
-    
+        self.clock = clock or default_clock
+        self.liquidity = liquidity
+        self.ticks_per_unit = ticks_per_unit
+        # current bar price (None until set_bar) and the provider's
+        # remaining size for this bar (None = no cap)
+        self._bar_price: Optional[float] = None
+        self._bar_left: Optional[int] = None
+        # level key (price, or ticks on a tick book) -> level for each side
+        self._bid_levels: Dict[float, PriceLevel] = {}
+        self._ask_levels: Dict[float, PriceLevel] = {}
+        # heaps of level keys: bids store -key (max-heap), asks store key
+        self._bid_heap: List[float] = []
+        self._ask_heap: List[float] = []
+        # keys currently in each heap, live or stale
+        self._bid_heaped: set = set()
+        self._ask_heaped: set = set()
+        # order id -> live (order, level) entry for every resting order
+        self._index: Dict[str, Tuple[Order, PriceLevel]] = {}
+        # keys of levels changed since the last snapshot()/diff(), per
+        # side; None until the first one, so a book nobody reads L2
+        # updates from doesn't accumulate every key it ever touched
+        self._dirty_bids: Optional[set] = None
+        self._dirty_asks: Optional[set] = None
+        # counter for ids generated by add_orders from columnar input
+        self._batch_seq = 0
+        # pending stops: buy stops by stop price (min-heap), sell stops by
+        # -stop price; entries are (key, seq, order), live while _stops
+        # maps the order id to that exact entry
+        self._buy_stops: List[Tuple[float, int, Order]] = []
+        self._sell_stops: List[Tuple[float, int, Order]] = []
+        self._stops: Dict[str, Tuple[float, int, Order]] = {}
+        self._stop_seq = 0
+        # price of the most recent trade (or update_price)
+        self.last_price: Optional[float] = None
+
+    @property
+    def bids(self) -> List[Order]:
+        """
+        Resting buy orders, highest price first (snapshot, for inspection).
+        """
+        return [entry[0] for p in sorted(self._bid_levels, reverse=True)
+                for entry in self._bid_levels[p].orders
+                if self._index.get(entry[0].id) is entry]
+
+    @property
+    def asks(self) -> List[Order]:
+        """
+        Resting sell orders, lowest price first (snapshot, for inspection).
+        """
+        return [entry[0] for p in sorted(self._ask_levels)
+                for entry in self._ask_levels[p].orders
+                if self._index.get(entry[0].id) is entry]
+
+    @property
+    def stops(self) -> List[Order]:
+        """
+        Pending stop orders in submission order (snapshot, for inspection).
+        """
+        return [entry[2] for entry in sorted(self._stops.values(), key=lambda e: e[1])]
+
+    def __contains__(self, order_id) -> bool:
+        """
+        True if `order_id` is currently resting in the book or is a
+        pending stop.
+        """
+        return order_id in self._index or order_id in self._stops
+
+    def best_bid(self) -> Optional[float]:
+        level = self._best_level(Side.BUY)
+        return level.price if level else None
+
+    def best_ask(self) -> Optional[float]:
+        level = self._best_level(Side.SELL)
+        return level.price if level else None
+
+    def _levels_from_best(self, side: Side, n: int) -> List[PriceLevel]:
+        """
+        The best n live levels on `side`, best price first: one
+        O(levels log n) pass over the level dict (never the heap, which
+        may hold stale prices).
+        """
+        if side == Side.BUY:
+            levels = self._bid_levels
+            prices = heapq.nlargest(n, levels)
+        else:
+            levels = self._ask_levels
+            prices = heapq.nsmallest(n, levels)
+        return [levels[p] for p in prices]
+
+    def depth(self, n: int = 5) -> Dict[str, List[Tuple[float, int]]]:
+        """
+        Aggregated (price, quantity) for the best n levels per side:
+        {"bids": highest first, "asks": lowest first}.
+        """
+        out = {}
+        for name, side in (("bids", Side.BUY), ("asks", Side.SELL)):
+            out[name] = [(level.price, level.quantity)
+                         for level in self._levels_from_best(side, n)]
+        return out
+
+    def vwap_for_qty(self, side, qty: int) -> Tuple[Optional[float], int]:
+        """
+        Pre-trade impact estimate: the average price a market order of
+        `qty` on `side` ("buy" walks the asks, "sell" the bids) would get
+        right now, and how much of it the book could fill. Returns
+        (vwap, filled_qty); vwap is None if the opposite side is empty.
+        Nothing in the book changes (stops and bar liquidity are not
+        considered).
+        """
+        opposite = Side.SELL if SIDE_CODES[side] == Side.BUY else Side.BUY
+        n_levels = len(self._ask_levels if opposite == Side.SELL else self._bid_levels)
+        remaining, notional = qty, 0.0
+        # take the best 8 levels, then 4x more each time the size runs on
+        seen, n = 0, 8
+        while remaining and seen < n_levels:
+            for level in self._levels_from_best(opposite, n)[seen:]:
+                take = min(remaining, level.quantity)
+                notional += take * level.price
+                remaining -= take
+                if remaining == 0:
+                    break
+            seen, n = n, 4 * n
+        filled = qty - remaining
+        return (notional / filled if filled else None), filled
+
+    def snapshot(self) -> Dict:
+        """
+        Full aggregated L2 book: {"symbol", "timestamp", "last_price",
+        "bids": [(price, quantity)] highest first, "asks": lowest first}.
+        Also resets the change set, so diff() afterwards is relative to
+        this snapshot.
+        """
+        self._dirty_bids, self._dirty_asks = set(), set()
+        bid_levels, ask_levels = self._bid_levels, self._ask_levels
+        return {
+            "symbol":     self.symbol,
+            "timestamp":  self.clock.now(),
+            "last_price": self.last_price,
+            "bids":       [(bid_levels[k].price, bid_levels[k].quantity)
+                           for k in sorted(bid_levels, reverse=True)],
+            "asks":       [(ask_levels[k].price, ask_levels[k].quantity)
+                           for k in sorted(ask_levels)],
+        }
+
+    def diff(self) -> Dict:
+        """
+        Levels changed since the last snapshot() or diff(), as
+        (price, quantity) per side; quantity 0 means the level is gone.
+        Applying them to the previous snapshot gives the current book.
+        Before any snapshot() or diff() this is every live level (the
+        change from an empty book), and changes are tracked from then on.
+        """
+        if self._dirty_bids is None:
+            bids = sorted(self._bid_levels, reverse=True)
+            asks = sorted(self._ask_levels)
+        else:
+            bids = sorted(self._dirty_bids, reverse=True)
+            asks = sorted(self._dirty_asks)
+        self._dirty_bids, self._dirty_asks = set(), set()
+        get_bid, get_ask = self._bid_levels.get, self._ask_levels.get
+        price = self._price_of
+        return {
+            "symbol":     self.symbol,
+            "timestamp":  self.clock.now(),
+            "last_price": self.last_price,
+            "bids":       [(price(k), level.quantity if (level := get_bid(k)) else 0)
+                           for k in bids],
+            "asks":       [(price(k), level.quantity if (level := get_ask(k)) else 0)
+                           for k in asks],
+        }
+
     def add_order(self, order: Order) -> List[Dict]:
         """
-        Handle a new incoming order (market, limit, or stop).
-        Returns a list of execution report dicts.
+        Handle a new incoming order (market, limit, stop or stop_limit).
+        Returns a list of execution report dicts, including those of any
+        stops its fills trigger. A remainder that neither fills nor rests
+        gets a "canceled" report with filled_qty 0.
         """
-        reports = []
+        t0 = instrumentation.now() if instrumentation.enabled else 0
+        fills = self._process(order)
+        reports = self._reports(order, fills)
+        if self._stops:
+            reports.extend(self._stop_reports(fills))
+        # a remainder that neither filled nor rested (a market order out of
+        # liquidity) is done; a stop triggered on arrival already has its report
+        if order.quantity > 0 and order.id not in self and not any(
+                rpt["order_id"] == order.id and rpt["status"] == "canceled"
+                for rpt in reports):
+            reports.append(self._cancel_report(order))
+        if t0:
+            instrumentation.record("book.add_order", t0)
+        return reports
+
+    def add_orders(
+        self,
+        orders:   Optional[Sequence[Order]] = None,
+        *,
+        side:     Optional[Sequence] = None,
+        quantity: Optional[Sequence[int]] = None,
+        price:    Optional[Sequence[float]] = None,
+        ids:      Optional[Sequence] = None
+    ) -> np.ndarray:
+        """
+        Process a batch of orders in sequence and return every fill as one
+        structured array of FILL_DTYPE, without building report dicts.
+
+        Pass either `orders`, or columnar `side` ("buy"/"sell" or +1/-1),
+        `quantity` and `price` arrays (NaN price = market order; `ids`
+        defaults to "<symbol>-<n>"). `taker_idx`/`maker_idx` are positions
+        in the batch; `maker_idx` is -1 for orders that rested before it.
+        Stops triggered during the batch add their fills too, with
+        `taker_idx` the stop's batch position (-1 if submitted earlier).
+        """
+        if orders is None:
+            orders = self._orders_from_columns(side, quantity, price, ids)
+
+        # order id -> batch position, for makers submitted in this batch
+        batch_pos: Dict[str, int] = {}
+        rows = []
+        # rows whose fill completed the incoming order
+        done_rows = []
+
+        def add_rows(taker_idx, order, fills):
+            sign = int(SIDE_CODES[order.side])
+            for best, fill_qty, trade_price in fills:
+                if best is None:
+                    # bar liquidity
+                    rows.append((taker_idx, -1, sign, fill_qty, trade_price, False, False))
+                    continue
+                rows.append((taker_idx, batch_pos.get(best.id, -1), sign, fill_qty,
+                             trade_price, False, best.quantity == 0))
+            if order.quantity == 0:
+                done_rows.append(len(rows) - 1)
+
+        for i, order in enumerate(orders):
+            fills = self._process(order)
+            if fills:
+                add_rows(i, order, fills)
+            if order.id in self:
+                batch_pos[order.id] = i
+            if self._stops:
+                for stop, stop_fills in self._run_stops(fills):
+                    if stop_fills:
+                        add_rows(batch_pos.get(stop.id, -1), stop, stop_fills)
 
-        if order.type == "market":
-            reports += self._execute_market(order)
+        out = np.zeros(len(rows), dtype=FILL_DTYPE)
+        if rows:
+            cols = np.array(rows, dtype=_ROW_DTYPE)
+            for name in _ROW_DTYPE.names:
+                out[name] = cols[name]
+            out["taker_done"][done_rows] = True
+        out["timestamp"] = np.datetime64(self.clock.now_ns(), "ns")
+        return out
 
-        elif order.type == "limit":
+    def _orders_from_columns(self, side, quantity, price, ids) -> List[Order]:
+        """
+        Build Order objects from columnar side/quantity/price arrays.
+        """
+        side     = np.asarray(side)
+        quantity = np.asarray(quantity, dtype=np.int64)
+        price    = np.asarray(price, dtype=np.float64)
+        if not len(side) == len(quantity) == len(price):
+            raise ValueError("side, quantity and price must have the same length")
+        if side.dtype.kind in "iuf":
+            side = np.where(side > 0, "buy", "sell")
+        if ids is None:
+            start = self._batch_seq
+            ids = [f"{self.symbol}-{n}" for n in range(start, start + len(side))]
+            self._batch_seq += len(side)
+
+        return [
+            Order(
+                id=oid,
+                symbol=self.symbol,
+                side=s,
+                quantity=q,
+                type="market" if p != p else "limit",
+                price=None if p != p else p
+            )
+            for oid, s, q, p in zip(ids, side.tolist(), quantity.tolist(), price.tolist())
+        ]
+
+    def _process(self, order: Order) -> List[Fill]:
+        """
+        Match `order` and rest any limit remainder. Returns raw fills.
+        Raises ValueError if an order with the same id is already resting
+        or pending here (before anything is matched).
+        """
+        if order.id in self._index or order.id in self._stops:
+            raise ValueError(f"Order {order.id} is already in the book")
+        order_type = TYPE_CODES[order.type]
+        if order_type == OrderType.MARKET:
+            return self._execute_market(order)
+
+        if order_type == OrderType.LIMIT:
             # try to match immediately
-            reports += self._match_limit(order)
+            fills = self._match_limit(order)
             # if there’s leftover quantity, add to book
             if order.quantity > 0:
                 self._insert_resting(order)
+            return fills
+
+        # stop / stop-limit: wait for a trade through the stop price
+        self._park_stop(order)
+        return []
+
+    def update_price(self, price: float) -> List[Dict]:
+        """
+        Set the last traded price from outside the book (e.g. each bar's
+        price in a backtest) and run any stops it crosses.
+        Returns their execution reports.
+        """
+        self.last_price = price
+        return self._stop_reports([]) if self._stops else []
 
+    def set_bar(self, price: float, volume: Optional[float] = None) -> List[Dict]:
+        """
+        Start a new bar for the liquidity provider (requires `liquidity`):
+        resets its size to participation * volume (no cap if volume is
+        None or NaN), fills resting orders
+        its quote now crosses (at the quote, best first) and runs any
+        stops the bar price crosses. Returns their execution reports.
+        """
+        liquidity = self.liquidity
+        if liquidity is None:
+            raise ValueError("set_bar requires a book created with liquidity=BarLiquidity(...)")
+        if volume is None or volume != volume or liquidity.participation is None:
+            self._bar_left = None
         else:
-            # for now, treat stop orders as plain limit orders 
-            # once triggered by strategy logic
-            reports += self._match_limit(order)
-            if order.quantity > 0:
-                self._insert_resting(order)
+            self._bar_left = int(liquidity.participation * volume)
+
+        # the provider as a taker against resting orders (with its own
+        # quote switched off so it can't trade with itself)
+        self._bar_price = None
+        reports = []
+        for resting, taker in ((Side.BUY, "sell"), (Side.SELL, "buy")):
+            quote = self._quote(price, resting == Side.BUY)
+            levels = self._bid_levels if resting == Side.BUY else self._ask_levels
+            size = sum(level.quantity for level in levels.values()) \
+                if self._bar_left is None else self._bar_left
+            if size <= 0:
+                continue
+            provider = Order(id=None, symbol=self.symbol, side=taker, quantity=size,
+                             type="limit", price=quote)
+            fills = self._match(provider, self._limit_key(quote, taker == "buy"))
+            if fills:
+                if self._bar_left is not None:
+                    self._bar_left -= size - provider.quantity
+                reports.extend(self._reports(None, [(best, qty, quote) for best, qty, _ in fills]))
+
+        self._bar_price = price
+        self.last_price = price
+        if self._stops:
+            reports.extend(self._stop_reports([]))
+        return reports
+
+    def _quote(self, price: float, is_buy: bool) -> float:
+        """
+        The provider's price to a buyer (is_buy) or a seller.
+        """
+        liquidity = self.liquidity
+        cost = liquidity.spread / 2 + price * liquidity.slippage_bps / 1e4
+        return price + cost if is_buy else price - cost
+
+    def _take_bar(self, order: Order, quote: float, fills: List[Fill]):
+        """
+        Fill as much of `order` as the bar has left at `quote`.
+        """
+        qty = order.quantity if self._bar_left is None else min(order.quantity, self._bar_left)
+        if qty <= 0:
+            return
+        fills.append((None, qty, quote))
+        order.quantity -= qty
+        if self._bar_left is not None:
+            self._bar_left -= qty
+        if instrumentation.enabled:
+            instrumentation.count("book.bar_fills")
+
+    def _park_stop(self, order: Order):
+        stop = self._stop_trigger(order)
+        if SIDE_CODES[order.side] == Side.BUY:
+            heap, key = self._buy_stops, stop
+        else:
+            heap, key = self._sell_stops, -stop
+        entry = (key, self._stop_seq, order)
+        self._stop_seq += 1
+        heapq.heappush(heap, entry)
+        self._stops[order.id] = entry
+
+    @staticmethod
+    def _stop_trigger(order: Order) -> float:
+        stop = getattr(order, "stop_price", None)
+        return order.price if stop is None else stop
+
+    def _pop_triggered(self, low: float, high: float) -> List[Order]:
+        """
+        Pop the live stops crossed by trades between `low` and `high`:
+        buy stops at or below `high`, then sell stops at or above `low`,
+        each in stop price then submission order.
+        """
+        triggered = []
+        for heap, bound in ((self._buy_stops, high), (self._sell_stops, -low)):
+            while heap and heap[0][0] <= bound:
+                entry = heapq.heappop(heap)
+                order = entry[2]
+                if self._stops.get(order.id) is entry:
+                    del self._stops[order.id]
+                    triggered.append(order)
+        return triggered
 
+    def _run_stops(self, fills: List[Fill]):
+        """
+        Trigger the stops crossed by `fills` (or by last_price if there
+        are none) and match them one by one, triggering further stops
+        from their own fills. Yields (stop order, its fills).
+        """
+        if fills:
+            prices = [f[2] for f in fills]
+            low, high = min(prices), max(prices)
+        elif self.last_price is not None:
+            low = high = self.last_price
+        else:
+            return
+        pending = deque(self._pop_triggered(low, high))
+        while pending:
+            order = pending.popleft()
+            if instrumentation.enabled:
+                instrumentation.count("book.stops_triggered")
+            # from here on it is an ordinary market / limit order
+            is_market = TYPE_CODES[order.type] == OrderType.STOP
+            if isinstance(order.type, OrderType):
+                order.type = OrderType.MARKET if is_market else OrderType.LIMIT
+            else:
+                order.type = "market" if is_market else "limit"
+            stop_fills = self._process(order)
+            yield order, stop_fills
+            if stop_fills:
+                prices = [f[2] for f in stop_fills]
+                pending.extend(self._pop_triggered(min(prices), max(prices)))
+
+    def _stop_reports(self, fills: List[Fill]) -> List[Dict]:
+        """
+        Execution reports for the stops triggered by `fills`. A triggered
+        stop whose remainder neither fills nor rests (a market order out
+        of liquidity) gets a "canceled" report with filled_qty 0.
+        """
+        reports = []
+        for order, stop_fills in self._run_stops(fills):
+            reports.extend(self._reports(order, stop_fills))
+            if order.quantity > 0 and order.id not in self._index:
+                reports.append(self._cancel_report(order))
         return reports
-    
-    def _match_limit(self, order: Order) -> List[Dict]:
+
+    def _cancel_report(self, order: Order) -> Dict:
+        return {
+            "order_id":   order.id,
+            "symbol":     order.symbol,
+            "side":       order.side,
+            "filled_qty": 0,
+            "price":      None,
+            "timestamp":  self.clock.now(),
+            "status":     "canceled"
+        }
+
+    def cancel(self, order_id: str) -> Optional[Order]:
+        """
+        Remove a resting order or pending stop from the book in O(1).
+        Returns the order, or None if it is not here.
+        """
+        stop = self._stops.pop(order_id, None)
+        if stop is not None:
+            return stop[2]
+        entry = self._index.pop(order_id, None)
+        if entry is None:
+            return None
+        order, level = entry
+        side = SIDE_CODES[order.side]
+        level.count -= 1
+        level.quantity -= order.quantity
+        dirty = self._dirty_bids if side == Side.BUY else self._dirty_asks
+        if dirty is not None:
+            dirty.add(level.key)
+        if level.count == 0:
+            self._remove_level(side, level)
+        elif len(level.orders) > 2 * level.count + _COMPACT_SLACK:
+            index = self._index
+            level.orders = deque(e for e in level.orders if index.get(e[0].id) is e)
+        return order
+
+    def reduce(self, order_id: str, new_qty: int) -> Optional[Order]:
+        """
+        Shrink a resting order in place, keeping its time priority.
+        Returns the order, or None if it is not resting here.
+        """
+        entry = self._index.get(order_id)
+        if entry is None:
+            return None
+        order, level = entry
+        if not 0 < new_qty <= order.quantity:
+            raise ValueError("Reduce requires 0 < new_qty <= current quantity")
+        level.quantity -= order.quantity - new_qty
+        order.quantity = new_qty
+        dirty = self._dirty_bids if SIDE_CODES[order.side] == Side.BUY else self._dirty_asks
+        if dirty is not None:
+            dirty.add(level.key)
+        return order
+
+    def amend(
+        self,
+        order_id:  str,
+        new_qty:   Optional[int]   = None,
+        new_price: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        Amend a resting order. A quantity decrease keeps time priority;
+        a price change or quantity increase re-queues the order at the
+        back of its (new) level, matching first if the new price crosses.
+        Returns any execution reports produced by the re-queue.
+
+        A pending stop is re-submitted with the new quantity/price (the
+        stop price of a stop, the limit price of a stop_limit).
+        """
+        if order_id in self._stops:
+            order = self.cancel(order_id)
+            if new_qty is not None:
+                order.quantity = new_qty
+            if new_price is not None:
+                order.price = new_price
+            return self.add_order(order)
+        entry = self._index.get(order_id)
+        if entry is None:
+            raise KeyError(f"Order {order_id} is not resting in the book")
+        order = entry[0]
+        price_changed = new_price is not None and new_price != order.price
+        if not price_changed and (new_qty is None or new_qty <= order.quantity):
+            if new_qty is not None:
+                self.reduce(order_id, new_qty)
+            return []
+
+        self.cancel(order_id)
+        if new_qty is not None:
+            order.quantity = new_qty
+        if new_price is not None:
+            order.price = new_price
+        return self.add_order(order)
+
+    def _best_level(self, side: Side) -> Optional[PriceLevel]:
+        """
+        Return the best level on `side` (BUY = bids, SELL = asks),
+        discarding heap entries for levels that no longer exist.
+        """
+        if side == Side.BUY:
+            heap, levels, heaped, sign = self._bid_heap, self._bid_levels, self._bid_heaped, -1
+        else:
+            heap, levels, heaped, sign = self._ask_heap, self._ask_levels, self._ask_heaped, 1
+        while heap:
+            level = levels.get(sign * heap[0])
+            if level is not None:
+                return level
+            heaped.discard(sign * heapq.heappop(heap))
+        return None
+
+    def _remove_level(self, side: Side, level: PriceLevel):
+        """
+        Drop an empty level. The heap entry is popped if it is on top,
+        otherwise it is skipped later by _best_level (or dropped when the
+        heap is rebuilt).
+        """
+        if side == Side.BUY:
+            heap, levels, heaped, sign = self._bid_heap, self._bid_levels, self._bid_heaped, -1
+        else:
+            heap, levels, heaped, sign = self._ask_heap, self._ask_levels, self._ask_heaped, 1
+        del levels[level.key]
+        if heap and heap[0] == sign * level.key:
+            heapq.heappop(heap)
+            heaped.discard(level.key)
+        elif len(heap) > 2 * len(levels) + _COMPACT_SLACK:
+            heap[:] = [sign * key for key in levels]
+            heapq.heapify(heap)
+            heaped.clear()
+            heaped.update(levels)
+
+    def _match_limit(self, order: Order) -> List[Fill]:
         """
         Match a limit order against the book.
         Fill as much as possible at prices satisfying the limit.
         """
-        reports = []
-        # choose opposite side
-        opposite = self.asks if order.side == "buy" else self.bids
+        return self._match(order, self._key(order))
 
-        # continue matching while we still have quantity
-        # and there is a resting order that satisfies the price
-        while order.quantity > 0 and opposite:
-            best = opposite[0]
+    def _execute_market(self, order: Order) -> List[Fill]:
+        """
+        Fill a market order against the full depth of the book.
+        """
+        return self._match(order, None)
+
+    def _key(self, order: Order):
+        """
+        The level key of a limit order's price: the price itself, or on a
+        tick book its ticks (a CompactOrder's own price_ticks when it uses
+        the book's tick size). An off-grid price goes to the tick on the
+        safe side of its limit, so it never trades or rests at a worse price.
+        """
+        tpu = self.ticks_per_unit
+        if tpu is None:
+            return order.price
+        if getattr(order, "ticks_per_unit", None) == tpu:
+            return order.price_ticks
+        return self._limit_key(order.price, SIDE_CODES[order.side] == Side.BUY)
+
+    def _limit_key(self, price: float, is_buy: bool):
+        """
+        The level key bounding a taker's limit `price`: a buy may take
+        levels at or below it, a sell at or above it.
+        """
+        tpu = self.ticks_per_unit
+        if tpu is None:
+            return price
+        ticks = round(price * tpu, 6)
+        return math.floor(ticks) if is_buy else math.ceil(ticks)
+
+    def _price_of(self, key) -> float:
+        tpu = self.ticks_per_unit
+        return key if tpu is None else key / tpu
+
+    def _match(self, order: Order, limit=None) -> List[Fill]:
+        """
+        Walk the opposite side best level first, filling `order` until it is
+        done, the book is empty, or (when `limit`, a level key, is set) the
+        next level no longer satisfies the limit.
+        Returns raw (resting order, fill qty, price) tuples; quantities on
+        both orders are already decremented.
+        """
+        t0 = instrumentation.now() if instrumentation.enabled else 0
+        fills = []
+        walked = 0
+        # opposite side = asks if buy; bids if sell
+        is_buy = SIDE_CODES[order.side] == Side.BUY
+        opposite_side = Side.SELL if is_buy else Side.BUY
+        dirty = self._dirty_asks if is_buy else self._dirty_bids
+        bar_quote = None if self._bar_price is None else self._quote(self._bar_price, is_buy)
+        limit_price = None if limit is None else self._price_of(limit)
+
+        while order.quantity > 0:
+            level = self._best_level(opposite_side)
+            # the bar's quote trades first while it is at least as good as
+            # the best resting level (and within the limit)
+            if bar_quote is not None and (level is None or (
+                    level.price >= bar_quote if is_buy else level.price <= bar_quote)):
+                if limit is None or (bar_quote <= limit_price if is_buy
+                                     else bar_quote >= limit_price):
+                    self._take_bar(order, bar_quote, fills)
+                bar_quote = None
+                continue
+            if level is None:
+                break
             # buy order matches if best ask <= order.price
-            if order.side == "buy" and best.price > order.price:
+            if limit is not None and is_buy and level.key > limit:
                 break
             # sell order matches if best bid >= order.price
-            if order.side == "sell" and best.price < order.price:
+            if limit is not None and not is_buy and level.key < limit:
                 break
 
-            # a fill occurs: trade quantity = min(incoming, resting)
-            fill_qty   = min(order.quantity, best.quantity)
-            trade_price = best.price
-            timestamp   = datetime.utcnow()
+            walked += 1
+            before = order.quantity
+            queue = level.orders
+            while order.quantity > 0 and queue:
+                entry = queue[0]
+                best = entry[0]
+                # skip entries that were cancelled or re-queued
+                if self._index.get(best.id) is not entry:
+                    queue.popleft()
+                    continue
+                # a fill occurs: trade quantity = min(incoming, resting)
+                fill_qty = min(order.quantity, best.quantity)
+                fills.append((best, fill_qty, level.price))
 
-            # build execution report for the incoming order
-            reports.append({
-                "order_id":      order.id,
-                "symbol":        order.symbol,
-                "side":          order.side,
-                "filled_qty":    fill_qty,
-                "price":         trade_price,
-                "timestamp":     timestamp,
-                "status":        "filled" if fill_qty == order.quantity else "partial_fill"
-            })
+                # decrement quantities
+                order.quantity -= fill_qty
+                best.quantity  -= fill_qty
 
-            # also build report for the resting order
-            reports.append({
-                "order_id":      best.id,
-                "symbol":        best.symbol,
-                "side":          best.side,
-                "filled_qty":    fill_qty,
-                "price":         trade_price,
-                "timestamp":     timestamp,
-                "status":        "filled" if fill_qty == best.quantity else "partial_fill"
-            })
+                # remove resting order if fully filled
+                if best.quantity == 0:
+                    queue.popleft()
+                    del self._index[best.id]
+                    level.count -= 1
 
-            # decrement quantities
-            order.quantity -= fill_qty
-            best.quantity  -= fill_qty
+            # the level gave up exactly what the incoming order took
+            level.quantity -= before - order.quantity
+            if dirty is not None:
+                dirty.add(level.key)
+            if level.count == 0:
+                self._remove_level(opposite_side, level)
 
-            # remove resting order if fully filled
-            if best.quantity == 0:
-                opposite.pop(0)
+        if fills:
+            self.last_price = fills[-1][2]
+        if t0:
+            instrumentation.record("book.match", t0)
+            instrumentation.count("book.fills", len(fills))
+            instrumentation.count("book.levels_walked", walked)
+        return fills
 
-        return reports
-    
-    def _execute_market(self, order: Order) -> List[Dict]:
+    def _reports(self, order: Order, fills: List[Fill]) -> List[Dict]:
         """
-        Fill a market order against the full depth of the book.
+        Build the two execution report dicts (incoming, resting) per fill.
+        Each resting order appears in at most one fill of a match, and only
+        the last fill can complete the incoming order, so final quantities
+        are enough to tell "filled" from "partial_fill".
+        The bar's liquidity provider (order or resting order None) gets
+        no report.
         """
         reports = []
-        # opposite side = asks if buy; bids if sell
-        opposite = self.asks if order.side == "buy" else self.bids
-
-        while order.quantity > 0 and opposite:
-            best = opposite[0]
-            fill_qty    = min(order.quantity, best.quantity)
-            trade_price = best.price
-            timestamp   = datetime.utcnow()
-
-            reports.append({
-                "order_id":   order.id,
-                "symbol":     order.symbol,
-                "side":       order.side,
-                "filled_qty": fill_qty,
-                "price":      trade_price,
-                "timestamp":  timestamp,
-                "status":     "filled" if fill_qty == order.quantity else "partial_fill"
-            })
+        timestamp = self.clock.now()
+        last = len(fills) - 1
+        for i, (best, fill_qty, trade_price) in enumerate(fills):
+            # build execution report for the incoming order
+            if order is not None:
+                reports.append({
+                    "order_id":   order.id,
+                    "symbol":     order.symbol,
+                    "side":       order.side,
+                    "filled_qty": fill_qty,
+                    "price":      trade_price,
+                    "timestamp":  timestamp,
+                    "status":     "filled" if i == last and order.quantity == 0 else "partial_fill"
+                })
+            if best is None:
+                continue
 
+            # also build report for the resting order
             reports.append({
                 "order_id":   best.id,
                 "symbol":     best.symbol,
@@ -128,33 +858,34 @@ class LimitOrderBook:
                 "filled_qty": fill_qty,
                 "price":      trade_price,
                 "timestamp":  timestamp,
-                "status":     "filled" if fill_qty == best.quantity else "partial_fill"
+                "status":     "filled" if best.quantity == 0 else "partial_fill"
             })
-
-            order.quantity -= fill_qty
-            best.quantity  -= fill_qty
-
-            if best.quantity == 0:
-                opposite.pop(0)
-
         return reports
+
     def _insert_resting(self, order: Order):
         """
-        Place a remainder limit order into bids or asks,
-        maintaining sorted order.
+        Place a remainder limit order at the back of its price level,
+        creating the level if needed.
         """
-        book = self.bids if order.side == "buy" else self.asks
-
-        # find insertion index
-        idx = 0
-        while idx < len(book):
-            # for bids: descending price; for asks: ascending price
-            better_price = (book[idx].price > order.price) if order.side == "buy" \
-                            else (book[idx].price < order.price)
-            if better_price:
-                idx += 1
-            else:
-                break
+        key = self._key(order)
+        if SIDE_CODES[order.side] == Side.BUY:
+            levels, heap, sign = self._bid_levels, self._bid_heap, -1
+            heaped, dirty = self._bid_heaped, self._dirty_bids
+        else:
+            levels, heap, sign = self._ask_levels, self._ask_heap, 1
+            heaped, dirty = self._ask_heaped, self._dirty_asks
 
-        # insert at idx
-        book.insert(idx, order)
+        level = levels.get(key)
+        if level is None:
+            level = levels[key] = PriceLevel(self._price_of(key), key)
+            # a stale entry for this key is live again
+            if key not in heaped:
+                heapq.heappush(heap, sign * key)
+                heaped.add(key)
+        entry = (order, level)
+        level.orders.append(entry)
+        level.count += 1
+        level.quantity += order.quantity
+        if dirty is not None:
+            dirty.add(key)
+        self._index[order.id] = entry
@@ -0,0 +1,139 @@
+"""
+Parallel parameter sweeps over a strategy's run_backtest
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+class SharedHistoryLoader:
+    """
+    Stand-in for MarketDataLoader inside sweep workers: serves histories
+    that were loaded once by the parent. Every call hands out a shallow
+    copy, so strategies that add indicator columns don't leak them into
+    the next grid point.
+    """
+    def __init__(self, histories):
+        self._histories = histories
+
+    def get_history(self, symbol, start=None, end=None):
+        return self._histories[symbol].copy(deep=False)
+
+    def get_history_many(self, symbols, **kwargs):
+        return {symbol: self.get_history(symbol) for symbol in symbols}
+
+
+def expand_grid(param_grid):
+    """
+    {"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}].
+    A list of dicts is passed through unchanged.
+    """
+    if isinstance(param_grid, dict):
+        keys = list(param_grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*param_grid.values())]
+    return list(param_grid)
+
+
+def _to_shared(symbol, df):
+    """
+    Copy one history frame into a shared memory block laid out as a
+    (1 + n_columns, n_rows) float64 matrix: row 0 holds the index as int64
+    nanoseconds, the rest hold the numeric columns.
+    Returns the block and the (picklable) spec needed to attach to it.
+    """
+    columns = [c for c in df.columns if np.issubdtype(df[c].dtype, np.number)]
+    shape = (1 + len(columns), len(df))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * shape[0] * shape[1]))
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    block[0].view(np.int64)[:] = df.index.tz_convert('UTC').as_unit('ns').asi8
+    for row, col in enumerate(columns, start=1):
+        block[row] = df[col].to_numpy(dtype=np.float64)
+    return shm, {"symbol": symbol, "name": shm.name, "shape": shape, "columns": columns}
+
+
+def _from_shared(spec):
+    """
+    Attach to a block made by _to_shared and wrap it as a DataFrame whose
+    columns are views on the shared buffer (no copy, no unpickling).
+    """
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    block = np.ndarray(spec["shape"], dtype=np.float64, buffer=shm.buf)
+    index = pd.DatetimeIndex(block[0].view(np.int64).view('datetime64[ns]')).tz_localize('UTC')
+    df = pd.DataFrame({col: block[row] for row, col in enumerate(spec["columns"], start=1)},
+                      index=index, copy=False)
+    return shm, df
+
+
+# per-worker state, set by _init_worker
+_WORKER = {}
+
+
+def _init_worker(specs, run_backtest, symbols, risk_params, mode):
+    handles, histories = [], {}
+    for spec in specs:
+        shm, df = _from_shared(spec)
+        handles.append(shm)
+        histories[spec["symbol"]] = df
+    _WORKER.update(
+        handles=handles,
+        loader=SharedHistoryLoader(histories),
+        run_backtest=run_backtest,
+        symbols=symbols,
+        risk_params=risk_params,
+        mode=mode,
+    )
+
+
+def _run_point(params):
+    w = _WORKER
+    _, _, metrics = w["run_backtest"](*w["symbols"], w["loader"], w["risk_params"],
+                                      mode=w["mode"], **params)
+    return {**params, **{k: float(v) for k, v in metrics.items()}}
+
+
+def run_sweep(run_backtest, symbols, param_grid, loader, risk_params,
+              mode="vectorized", max_workers=None, chunksize=None):
+    """
+    Run `run_backtest` once per point of `param_grid` and collect the
+    metrics into one table (one row per point, parameter columns first).
+
+    symbols:    the strategy's leading symbol argument(s), e.g. ["AAPL"]
+                or ["KO", "PEP"] for the pair strategy
+    param_grid: {name: [values]} (full product) or a list of param dicts
+    mode:       execution mode passed through to run_backtest
+
+    History is loaded once through `loader` and placed in shared memory;
+    worker processes attach to it instead of reloading or unpickling
+    frames. max_workers=1 runs serially in this process.
+    """
+    symbols = list(symbols)
+    grid = expand_grid(param_grid)
+    histories = loader.get_history_many(symbols)
+
+    if max_workers == 1:
+        _WORKER.update(loader=SharedHistoryLoader(histories), run_backtest=run_backtest,
+                       symbols=symbols, risk_params=risk_params, mode=mode)
+        return pd.DataFrame([_run_point(params) for params in grid])
+
+    max_workers = max_workers or os.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, len(grid) // (4 * max_workers))
+
+    blocks, specs = [], []
+    try:
+        for symbol in symbols:
+            shm, spec = _to_shared(symbol, histories[symbol])
+            blocks.append(shm)
+            specs.append(spec)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(specs, run_backtest, symbols, risk_params, mode)) as pool:
+            rows = list(pool.map(_run_point, grid, chunksize=chunksize))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return pd.DataFrame(rows)
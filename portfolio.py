@@ -0,0 +1,143 @@
+"""
+Portfolio backtests over a universe of symbols, sharded across processes
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from position_tracker import BLOTTER_COLUMNS
+from streaming_backtest import StreamingBacktest
+
+
+def _legs(entry):
+    # a universe entry is a symbol, or a tuple of symbols for a pair
+    return tuple(entry) if isinstance(entry, (tuple, list)) else (entry,)
+
+
+def shard(universe, n_shards):
+    """
+    Split the universe round-robin into at most n_shards lists.
+    """
+    n_shards = max(1, min(n_shards, len(universe)))
+    return [universe[i::n_shards] for i in range(n_shards)]
+
+
+def _run_entry(entry, strategy, params, loader, risk_params, budget, chunk_size):
+    """
+    One universe entry on its own books, OMS and tracker. Returns the
+    tracker's raw blotter columns (symbol codes replaced by names) and a
+    summary row.
+    """
+    bt = StreamingBacktest(strategy(*_legs(entry), **params), loader, risk_params,
+                           chunk_size=chunk_size, starting_cash=budget,
+                           keep_blotter=True, enforce_limits=True)
+    metrics = bt.run()
+    tracker = bt.tracker
+    cols = tracker.blotter_arrays()
+    cols["symbol"] = np.asarray(tracker.symbols, dtype=object)[cols["symbol"]]
+    summary = tracker.get_pnl_summary(current_prices=bt.last_prices)
+    row = {
+        "entry":     "/".join(_legs(entry)),
+        "bars":      bt.bars,
+        "fills":     tracker.fill_count,
+        "rejected":  bt.rejected,
+        "total_pnl": summary["total_pnl"],
+        "cash":      tracker.cash,
+        **metrics,
+    }
+    return cols, row
+
+
+def _run_shard(entries, strategy, params, loader, risk_params, budget, chunk_size):
+    return [_run_entry(entry, strategy, params, loader, risk_params, budget, chunk_size)
+            for entry in entries]
+
+
+def merge_blotters(columns, symbols):
+    """
+    Merge per-entry blotter columns into one portfolio blotter ordered by
+    timestamp. The sort is stable, so fills at the same time keep the
+    universe order (and a pair's leg order).
+    """
+    merged = {name: np.concatenate([c[name] for c in columns]) if columns
+              else np.empty(0, dtype=dtype)
+              for name, dtype in BLOTTER_COLUMNS.items()}
+    if columns:
+        merged["symbol"] = np.concatenate([c["symbol"] for c in columns])
+    order = np.argsort(merged["timestamp"], kind="stable")
+    return pd.DataFrame({
+        "timestamp": merged["timestamp"][order].view("datetime64[ns]"),
+        "symbol":    pd.Categorical(merged["symbol"][order], categories=symbols),
+        "side":      pd.Categorical.from_codes((merged["side"][order] > 0).view(np.int8),
+                                               categories=["sell", "buy"]),
+        "quantity":  merged["quantity"][order],
+        "price":     merged["price"][order],
+        "cash_flow": merged["cash_flow"][order],
+    })
+
+
+def equity_curve(blotter, starting_cash):
+    """
+    Portfolio equity after each fill: cash plus every open position marked
+    at its symbol's latest fill price. Indexed by fill timestamp.
+    """
+    signed = np.where(blotter["side"] == "buy", 1, -1) * blotter["quantity"].to_numpy()
+    by_symbol = pd.Series(signed).groupby(blotter["symbol"].to_numpy())
+    position = by_symbol.cumsum().to_numpy()
+    value = position * blotter["price"].to_numpy()
+    # change in the filled symbol's market value at each fill
+    prev_value = pd.Series(value).groupby(blotter["symbol"].to_numpy()).shift(1).fillna(0.0)
+    equity = starting_cash + np.cumsum(blotter["cash_flow"].to_numpy()) + \
+        np.cumsum(value - prev_value.to_numpy())
+    return pd.Series(equity, index=pd.DatetimeIndex(blotter["timestamp"]), name="equity")
+
+
+def run_portfolio(strategy, universe, loader, risk_params, params=None,
+                  starting_cash=1_000_000.0, max_workers=None, chunk_size=10_000):
+    """
+    Run a streaming strategy (e.g. TrendFollowingStream) over every entry of
+    `universe`, a list of symbols or of symbol tuples for pair strategies:
+    strategy(*entry, **params) builds each entry's strategy.
+
+    Every entry runs on its own books, OMS and tracker with an equal share
+    of starting_cash. risk_params.max_pos and that cash budget are
+    enforced per entry (signals that would breach them are skipped).
+    Entries are sharded across max_workers processes (max_workers=1 runs
+    serially here); `loader` and `strategy` must be picklable.
+
+    Returns (blotter, equity, per_entry, metrics): the merged time-ordered
+    blotter, the portfolio equity curve, one summary row per entry and
+    portfolio metrics (total_return, max_drawdown, sharpe_ratio).
+    """
+    universe = list(universe)
+    params = params or {}
+    budget = starting_cash / max(len(universe), 1)
+    args = (strategy, params, loader, risk_params, budget, chunk_size)
+
+    if max_workers == 1:
+        results = _run_shard(universe, *args)
+    else:
+        max_workers = max_workers or os.cpu_count()
+        shards = shard(universe, 4 * max_workers)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_run_shard, entries, *args) for entries in shards]
+            by_entry = {}
+            for entries, future in zip(shards, futures):
+                by_entry.update(zip(map(_legs, entries), future.result()))
+        results = [by_entry[_legs(entry)] for entry in universe]
+
+    symbols = list(dict.fromkeys(s for entry in universe for s in _legs(entry)))
+    blotter = merge_blotters([r[0] for r in results], symbols)
+    equity = equity_curve(blotter, starting_cash)
+    per_entry = pd.DataFrame([r[1] for r in results])
+
+    total_pnl = float(per_entry["total_pnl"].sum()) if len(per_entry) else 0.0
+    returns = equity.diff().fillna(0)
+    metrics = {
+        "total_return": total_pnl / starting_cash,
+        "max_drawdown": (equity - equity.cummax()).min(),
+        "sharpe_ratio": returns.mean() / returns.std() * (252**0.5),
+    }
+    return blotter, equity, per_entry, metrics
@@ -1,49 +1,199 @@
+import numpy as np
 import pandas as pd
+from order import SIDE_CODES
+from clock import default_clock, to_ns
+import instrumentation
 from typing import List, Dict
 
+# blotter column name -> dtype
+BLOTTER_COLUMNS = {
+    "timestamp": np.int64,    # ns since epoch, UTC
+    "symbol":    np.int32,    # code into PositionTracker.symbols
+    "side":      np.int8,     # +1 buy, -1 sell
+    "quantity":  np.int64,
+    "price":     np.float64,
+    "cash_flow": np.float64,
+}
+
+
 class PositionTracker:
-    def __init__(self, starting_cash: float = 0.0):
+    """
+    Tracks positions and cash from execution reports and keeps a blotter
+    of every fill.
+
+    The blotter is stored column-wise in typed NumPy arrays that double in
+    capacity when full, so update() is amortized O(1) and get_blotter()
+    wraps the filled part of the arrays without copying them.
+
+    Each symbol also keeps a running average cost and realized PnL,
+    updated in O(1) per fill, so PnL summaries and mark-to-market cost
+    O(symbols) regardless of how many trades have been booked.
+
+    With keep_blotter=False fills only update positions, cash and PnL and
+    no blotter rows are stored, so memory stays bounded however many
+    fills stream through (get_blotter() is then empty).
+
+    `clock` (shared with the OMS and book in a backtest) stamps reports
+    that arrive without a timestamp.
+    """
+    def __init__(self, starting_cash: float = 0.0, capacity: int = 1024,
+                 keep_blotter: bool = True, clock=None):
         self.positions: Dict[str, int] = {}
+        # average entry price of the open position, per symbol
+        self.avg_cost: Dict[str, float] = {}
+        # PnL locked in by closing (part of) a position, per symbol
+        self.realized: Dict[str, float] = {}
         self.cash: float = starting_cash
-        self.blotter: List[Dict] = []
+        self.starting_cash: float = starting_cash
+        self.keep_blotter: bool = keep_blotter
+        self.clock = clock or default_clock
+        # fills booked, including any not kept in the blotter
+        self.fill_count: int = 0
+        # symbol code table for the blotter's symbol column
+        self.symbols: List[str] = []
+        self._symbol_codes: Dict[str, int] = {}
+        self._cols: Dict[str, np.ndarray] = {
+            name: np.empty(max(capacity, 1), dtype=dtype)
+            for name, dtype in BLOTTER_COLUMNS.items()
+        }
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
 
     def update(self, report: Dict) -> None:
+        t0 = instrumentation.now() if instrumentation.enabled else 0
         symbol    = report["symbol"]
         qty       = report["filled_qty"]
         price     = report["price"]
         side      = report["side"]
-        timestamp = report["timestamp"]
+        timestamp = report.get("timestamp")
+        # e.g. a cancel report for an unfilled remainder: nothing to book
+        if not qty:
+            return
 
-        # Update position
-        delta = qty if side == "buy" else -qty
-        self.positions[symbol] = self.positions.get(symbol, 0) + delta
+        # Update position, cost basis and realized PnL
+        sign  = SIDE_CODES[side]
+        delta = qty * sign
+        self._apply_fill(symbol, delta, price)
 
         # Update cash
-        cash_flow = -qty * price if side == "buy" else qty * price
+        cash_flow = -delta * price
         self.cash += cash_flow
+        self.fill_count += 1
 
-        # Record blotter entry
-        self.blotter.append({
-            "timestamp": timestamp,
-            "symbol":    symbol,
-            "side":      side,
-            "quantity":  qty,
-            "price":     price,
-            "cash_flow": cash_flow
-        })
+        if self.keep_blotter:
+            self._append(symbol, sign, qty, price, cash_flow, timestamp)
+        if t0:
+            instrumentation.record("tracker.update", t0)
+            instrumentation.count("tracker.fills")
 
-    def get_blotter(self) -> pd.DataFrame:
-        return pd.DataFrame(self.blotter)
+    def _append(self, symbol: str, sign: int, qty: int, price: float,
+                cash_flow: float, timestamp) -> None:
+        """
+        Record one blotter row.
+        """
+        code = self._symbol_codes.get(symbol)
+        if code is None:
+            code = self._symbol_codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        n = self._n
+        if n == len(self._cols["price"]):
+            self._grow()
+        cols = self._cols
+        cols["timestamp"][n] = to_ns(timestamp) if timestamp is not None else self.clock.now_ns()
+        cols["symbol"][n]    = code
+        cols["side"][n]      = sign
+        cols["quantity"][n]  = qty
+        cols["price"][n]     = price
+        cols["cash_flow"][n] = cash_flow
+        self._n = n + 1
 
-    def get_pnl_summary(self, current_prices: Dict[str, float] = None) -> Dict:
-        blotter_df    = self.get_blotter()
-        realized_pnl  = float(blotter_df["cash_flow"].sum())
+    def _apply_fill(self, symbol: str, delta: int, price: float) -> None:
+        """
+        Average-cost accounting for one fill of signed size `delta`.
+        Adding to a position re-averages the cost; reducing it realizes
+        (price - avg_cost) on the closed quantity; flipping through zero
+        closes the old position and opens the rest at `price`.
+        """
+        pos = self.positions.get(symbol, 0)
+        avg = self.avg_cost.get(symbol, 0.0)
+        new_pos = pos + delta
 
+        if pos == 0 or (pos > 0) == (delta > 0):
+            avg = (avg * abs(pos) + price * abs(delta)) / abs(new_pos)
+        else:
+            closed = min(abs(delta), abs(pos))
+            direction = 1 if pos > 0 else -1
+            self.realized[symbol] = self.realized.get(symbol, 0.0) + \
+                closed * (price - avg) * direction
+            if new_pos == 0:
+                avg = 0.0
+            elif (new_pos > 0) != (pos > 0):
+                avg = price
+
+        self.positions[symbol] = new_pos
+        self.avg_cost[symbol]  = avg
+
+    def _grow(self) -> None:
+        """
+        Double the capacity of every blotter column.
+        """
+        for name, col in self._cols.items():
+            bigger = np.empty(2 * len(col), dtype=col.dtype)
+            bigger[:self._n] = col[:self._n]
+            self._cols[name] = bigger
+
+    def blotter_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Views of the filled part of each raw blotter column (no copies).
+        """
+        return {name: col[:self._n] for name, col in self._cols.items()}
+
+    def get_blotter(self) -> pd.DataFrame:
+        """
+        Blotter as a DataFrame. Numeric columns and the timestamp column
+        (tz-naive UTC) are views on the tracker's arrays; symbol and side
+        are categoricals built from the integer codes.
+        """
+        cols = self.blotter_arrays()
+        return pd.DataFrame({
+            "timestamp": pd.Series(cols["timestamp"].view("datetime64[ns]"), copy=False),
+            "symbol":    pd.Categorical.from_codes(cols["symbol"], categories=self.symbols),
+            "side":      pd.Categorical.from_codes((cols["side"] > 0).view(np.int8),
+                                                   categories=["sell", "buy"]),
+            "quantity":  cols["quantity"],
+            "price":     cols["price"],
+            "cash_flow": cols["cash_flow"],
+        }, copy=False)
+
+    def unrealized_pnl(self, current_prices: Dict[str, float] = None) -> float:
+        """
+        Open-position PnL against average cost. Symbols without a price
+        are marked at cost (contribute nothing).
+        """
         unrealized_pnl = 0.0
         if current_prices:
             for sym, pos in self.positions.items():
-                price = current_prices.get(sym, 0.0)
-                unrealized_pnl += pos * price
+                price = current_prices.get(sym)
+                if pos and price is not None:
+                    unrealized_pnl += pos * (price - self.avg_cost[sym])
+        return unrealized_pnl
+
+    def mark_to_market(self, current_prices: Dict[str, float]) -> float:
+        """
+        Portfolio equity: cash plus open positions at `current_prices`
+        (symbols without a price are valued at average cost).
+        """
+        equity = self.cash
+        for sym, pos in self.positions.items():
+            if pos:
+                equity += pos * current_prices.get(sym, self.avg_cost[sym])
+        return equity
+
+    def get_pnl_summary(self, current_prices: Dict[str, float] = None) -> Dict:
+        realized_pnl   = sum(self.realized.values())
+        unrealized_pnl = self.unrealized_pnl(current_prices)
 
         total_pnl = realized_pnl + unrealized_pnl
         return {
@@ -0,0 +1,199 @@
+"""
+Asyncio market-data replay with bounded queues into the OMS
+
+A ReplayFeed pulls bars from a MarketDataLoader (any source: yfinance,
+FileReplaySource files, SyntheticSource) through iter_bars() and
+publishes each one to every subscriber's bounded asyncio.Queue. A full
+queue blocks the feed (backpressure), so a slow consumer slows the
+replay down instead of letting events pile up in memory.
+
+StrategyConsumer wraps a StreamingBacktest: every bar it receives goes
+through the strategy, the OMS and the books via StreamingBacktest.step.
+replay() runs one feed per distinct set of strategy symbols, so each
+strategy gets exactly the bars it would get running on its own (a pair
+strategy's inner join never drops bars from a single-symbol one).
+
+    stats, metrics = run_replay([TrendFollowingStream("AAA")], loader, rp)
+
+speed=None replays as fast as the consumers keep up; speed=60 replays 60
+seconds of bar time per second of wall time. stats reports each feed's
+throughput, how long it was blocked on full queues and how far behind
+schedule it fell, and each consumer's queue lag (publish -> dequeue)
+and processing time, to find the event rate the stack sustains.
+"""
+import asyncio
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from instrumentation import LatencyHistogram
+from streaming_backtest import StreamingBacktest, iter_bars
+
+
+class BarEvent(NamedTuple):
+    timestamp: int            # bar time, ns since epoch
+    prices:    Tuple[float, ...]
+    volumes:   Tuple[float, ...]
+    published: int            # perf_counter_ns() when put on the queues
+
+
+class ReplayFeed:
+    """
+    Replays the inner-joined bars of `symbols` (see iter_bars) to every
+    subscribed queue, then puts None on each to mark the end.
+    """
+    def __init__(self, loader, symbols, speed: Optional[float] = None,
+                 chunk_size: int = 10_000, queue_size: int = 1024):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be > 0 (or None for as fast as possible)")
+        self.loader = loader
+        self.symbols = list(symbols)
+        self.speed = speed
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        # stats
+        self.published = 0
+        self.elapsed = 0.0
+        self.blocked_ns = 0
+        self.max_behind_ns = 0
+        self.max_depth = 0
+
+    def subscribe(self, queue_size: Optional[int] = None) -> asyncio.Queue:
+        """
+        A new bounded queue that receives every bar.
+        """
+        queue = asyncio.Queue(maxsize=queue_size or self.queue_size)
+        self._queues.append(queue)
+        return queue
+
+    async def run(self) -> None:
+        queues = self._queues
+        speed = self.speed
+        start_wall = time.perf_counter_ns()
+        first_ts = None
+        for ts, prices, volumes in iter_bars(self.loader, self.symbols, self.chunk_size):
+            if speed is not None:
+                if first_ts is None:
+                    first_ts = ts
+                # wall time this bar is due at
+                due = start_wall + (ts - first_ts) / speed
+                ahead = due - time.perf_counter_ns()
+                if ahead > 0:
+                    await asyncio.sleep(ahead / 1e9)
+                elif -ahead > self.max_behind_ns:
+                    self.max_behind_ns = int(-ahead)
+
+            event = BarEvent(ts, prices, volumes, time.perf_counter_ns())
+            for queue in queues:
+                depth = queue.qsize()
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                if queue.full():
+                    t0 = time.perf_counter_ns()
+                    await queue.put(event)
+                    self.blocked_ns += time.perf_counter_ns() - t0
+                else:
+                    queue.put_nowait(event)
+            self.published += 1
+            # let consumers run even when no queue is full
+            if self.published % 256 == 0:
+                await asyncio.sleep(0)
+
+        for queue in queues:
+            await queue.put(None)
+        self.elapsed = (time.perf_counter_ns() - start_wall) / 1e9
+
+    def stats(self) -> dict:
+        return {
+            "symbols":        self.symbols,
+            "events":         self.published,
+            "elapsed_s":      self.elapsed,
+            "events_per_sec": self.published / self.elapsed if self.elapsed > 0 else None,
+            "blocked_s":      self.blocked_ns / 1e9,
+            "max_behind_s":   self.max_behind_ns / 1e9,
+            "max_queue_depth": self.max_depth,
+        }
+
+
+class StrategyConsumer:
+    """
+    Feeds bars from a ReplayFeed queue into a StreamingBacktest (its
+    strategy, OMS, books and tracker), recording queue lag and per-bar
+    processing time.
+    """
+    def __init__(self, backtest: StreamingBacktest, feed_symbols):
+        self.backtest = backtest
+        feed_symbols = list(feed_symbols)
+        # positions of the strategy's symbols in the feed's price tuples
+        self._legs = [feed_symbols.index(s) for s in backtest.strategy.symbols]
+        self.lag = LatencyHistogram()
+        self.process = LatencyHistogram()
+        self.reports = 0
+
+    async def consume(self, queue: asyncio.Queue) -> None:
+        step = self.backtest.step
+        legs = self._legs
+        while True:
+            event = await queue.get()
+            if event is None:
+                return
+            t0 = time.perf_counter_ns()
+            self.lag.add(t0 - event.published)
+            prices = tuple(event.prices[i] for i in legs)
+            volumes = tuple(event.volumes[i] for i in legs)
+            self.reports += len(step(event.timestamp, prices, volumes))
+            self.process.add(time.perf_counter_ns() - t0)
+
+    def stats(self) -> dict:
+        return {
+            "bars":          self.backtest.bars,
+            "reports":       self.reports,
+            "lag_p50_us":    (self.lag.quantile(0.50) or 0) / 1e3,
+            "lag_p99_us":    (self.lag.quantile(0.99) or 0) / 1e3,
+            "lag_max_us":    self.lag.max / 1e3,
+            "process_mean_us": self.process.total / self.process.count / 1e3
+                               if self.process.count else None,
+        }
+
+
+async def replay(strategies, loader, risk_params, speed=None, queue_size=1024,
+                 chunk_size=10_000, **backtest_kwargs):
+    """
+    Run every strategy as its own consumer (own OMS, books and tracker;
+    extra keyword arguments go to StreamingBacktest). Strategies on the
+    same set of symbols share one feed of those symbols' bars, so each
+    sees what it would see standalone. Returns (stats, metrics):
+    {"feeds": [...], "consumers": [...]} and each backtest's result().
+    """
+    feeds = {}
+    consumers = []
+    tasks = []
+    for strategy in strategies:
+        key = frozenset(strategy.symbols)
+        feed = feeds.get(key)
+        if feed is None:
+            feed = feeds[key] = ReplayFeed(loader, strategy.symbols, speed=speed,
+                                           chunk_size=chunk_size, queue_size=queue_size)
+        consumer = StrategyConsumer(StreamingBacktest(strategy, loader, risk_params,
+                                                      chunk_size=chunk_size, **backtest_kwargs),
+                                    feed.symbols)
+        consumers.append(consumer)
+        tasks.append(asyncio.create_task(consumer.consume(feed.subscribe())))
+    tasks.extend(asyncio.create_task(feed.run()) for feed in feeds.values())
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # a failed consumer would leave the feed blocked on its full queue
+        for task in tasks:
+            task.cancel()
+        raise
+    stats = {"feeds":     [feed.stats() for feed in feeds.values()],
+             "consumers": [c.stats() for c in consumers]}
+    return stats, [c.backtest.result() for c in consumers]
+
+
+def run_replay(strategies, loader, risk_params, **kwargs):
+    """
+    asyncio.run(replay(...)) for scripts and notebooks without a loop.
+    """
+    return asyncio.run(replay(strategies, loader, risk_params, **kwargs))
@@ -3,25 +3,43 @@ import numpy as np
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 import pandas as pd
-import uuid
 from datetime import datetime
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from order import Order
 from order import risk_params
 from oms import OrderManagementSystem
-from order_book import LimitOrderBook
+from book_router import BookRouter
+from order_book import BarLiquidity
 from position_tracker import PositionTracker
+from clock import SimulationClock
 from market_data_loader import MarketDataLoader
-
-def run_backtest(symbol1, symbol2, loader, risk_params, threshold=2.0):
+from strategies.signals import threshold_cross
+from strategies.execution import (check_mode, fill_bar, merge_legs, send_orders,
+                                  vectorized_fills, vectorized_pnl)
+import instrumentation
+
+def run_backtest(symbol1, symbol2, loader, risk_params, threshold=2.0, mode="event",
+                 liquidity=None):
+    """
+    mode="event" routes both legs of every signal through the OMS and order
+    books and returns trades as a list of execution reports.
+    mode="vectorized" fills both legs at the bar's prices straight from the
+    arrays (same trades and metrics) and returns trades as a DataFrame.
+
+    In event mode each leg fills against its symbol's bar (set_bar) under
+    `liquidity`, a BarLiquidity; the default fills everything at the bar
+    prices, which is what the vectorized mode assumes.
+    """
+    check_mode(mode)
     # Load price history
-    hist1 = loader.get_history(symbol1)
-    hist2 = loader.get_history(symbol2)
+    hists = loader.get_history_many([symbol1, symbol2])
+    hist1 = hists[symbol1]
+    hist2 = hists[symbol2]
     sqz1 = hist1["last_price"].squeeze()
     sqz2 = hist2["last_price"].squeeze()
+    t0 = instrumentation.now() if instrumentation.enabled else 0
 
     # Align timestamps
     df = pd.DataFrame({
@@ -34,115 +52,75 @@ def run_backtest(symbol1, symbol2, loader, risk_params, threshold=2.0):
     df["spread"] = df["p1"] - beta * df["p2"]
     df["timestamp"] = df.index
 
-    # Generate trading signals
-    df["signal"] = 0
-    for i in range(1, len(df)):
-        prev_spread = df["spread"].iloc[i - 1]
-        curr_spread = df["spread"].iloc[i]
-
-        if prev_spread < threshold and curr_spread > threshold:
-            df.loc[df.index[i], "signal"] = -1  # short spread
-        elif prev_spread > -threshold and curr_spread < -threshold:
-            df.loc[df.index[i], "signal"] = 1   # long spread
-        elif abs(prev_spread) > threshold and abs(curr_spread) < threshold:
-            df.loc[df.index[i], "signal"] = 0   # close position
-
-    # Initialize systems
-    oms = OrderManagementSystem()
-    book1 = LimitOrderBook(symbol1)
-    book2 = LimitOrderBook(symbol2)
-    starting_cash = 1_000_000
-    tracker = PositionTracker(starting_cash=starting_cash)
-    trades_list = []
+    # Generate trading signals: -1 short spread above +threshold,
+    # 1 long spread below -threshold, 0 otherwise (incl. closing)
+    df["signal"] = threshold_cross(df["spread"], threshold)
+    if t0:
+        instrumentation.record("strategy.signals", t0)
 
-    # Loop over signals
-    for i, row in df.iterrows():
-        sig = row["signal"]
-        if sig == 0:
-            continue
+    starting_cash = 1_000_000
+    last1 = df["p1"].iloc[-1]
+    last2 = df["p2"].iloc[-1]
 
-        ts = row["timestamp"]
-        price1 = row["p1"]
-        price2 = row["p2"]
+    if mode == "vectorized":
+        # asset1 follows the signal, asset2 takes the opposite side
         qty = risk_params.order_size
-
-        # Create orders: asset1 = p1, asset2 = p2
-        order1 = Order(
-            id=str(uuid.uuid4()),
-            symbol=symbol1,
-            side="buy" if sig > 0 else "sell",
-            quantity=qty,
-            type=risk_params.order_type,
-            price=None if risk_params.order_type == "market" else float(price1),
-            timestamp=ts
-        )
-
-        order2 = Order(
-            id=str(uuid.uuid4()),
-            symbol=symbol2,
-            side="sell" if sig > 0 else "buy",  # opposite of order1
-            quantity=qty,
-            type=risk_params.order_type,
-            price=None if risk_params.order_type == "market" else float(price2),
-            timestamp=ts
-        )
-
-        # Insert counterparties to absorb orders (fake)
-        counter1 = Order(
-            id=f"FAKE-{uuid.uuid4()}",
-            symbol=symbol1,
-            side="sell" if sig > 0 else "buy",
-            quantity=qty,
-            type="limit",
-            price=price1,
-            timestamp=ts
-        )
-        counter2 = Order(
-            id=f"FAKE-{uuid.uuid4()}",
-            symbol=symbol2,
-            side="buy" if sig > 0 else "sell",
-            quantity=qty,
-            type="limit",
-            price=price2,
-            timestamp=ts
+        trades_df = merge_legs(
+            vectorized_fills(symbol1, df.index, df["signal"], df["p1"], qty),
+            vectorized_fills(symbol2, df.index, df["signal"], df["p2"], qty, leg_sign=-1),
         )
-
-        oms.new_order(counter1)
-        oms.new_order(counter2)
-        oms.new_order(order1)
-        oms.new_order(order2)
-
-        book1.add_order(counter1)
-        book2.add_order(counter2)
-        reports1 = book1.add_order(order1)
-        reports2 = book2.add_order(order2)
-
-        for rpt in reports1 + reports2:
-            if str(rpt["order_id"]).startswith("FAKE"):
-                continue
+        total_pnl = vectorized_pnl(trades_df, {symbol1: last1, symbol2: last2})
+        metrics_dict = _metrics(trades_df["cash_flow"], total_pnl, starting_cash)
+        return df, trades_df, metrics_dict
+
+    # Initialize systems (sharing one clock that follows the bars);
+    # the router keeps a book per symbol behind the OMS
+    clock = SimulationClock()
+    router = BookRouter(clock=clock, liquidity=liquidity or BarLiquidity())
+    oms = OrderManagementSystem(matching_engine=router, clock=clock)
+    tracker = PositionTracker(starting_cash=starting_cash, clock=clock)
+    trades_list = []
+    vol1 = hist1["volume"].squeeze().reindex(df.index)
+    vol2 = hist2["volume"].squeeze().reindex(df.index)
+
+    # Loop over signals; asset1 = p1 is bought on +1, asset2 = p2 is the
+    # opposite leg
+    for ts, sig, price1, price2, v1, v2 in zip(df["timestamp"], df["signal"],
+                                               df["p1"].to_numpy(dtype=float).tolist(),
+                                               df["p2"].to_numpy(dtype=float).tolist(),
+                                               vol1.to_numpy(dtype=float).tolist(),
+                                               vol2.to_numpy(dtype=float).tolist()):
+        clock.set(ts)
+        legs = [(symbol1, 1, price1, v1), (symbol2, -1, price2, v2)]
+        reports = fill_bar(oms, legs)
+        if sig != 0:
+            reports += send_orders(oms, legs, sig, risk_params, ts)
+        for rpt in reports:
             tracker.update(rpt)
             trades_list.append(rpt)
 
     # P&L
-    last1 = df["p1"].iloc[-1]
-    last2 = df["p2"].iloc[-1]
     summary = tracker.get_pnl_summary(current_prices={
         symbol1: last1,
         symbol2: last2
     })
 
     blotter_df = tracker.get_blotter()
-    equity_curve = blotter_df["cash_flow"].cumsum() + starting_cash
+    metrics_dict = _metrics(blotter_df["cash_flow"], summary["total_pnl"], starting_cash)
+
+    return df, trades_list, metrics_dict
+
+
+def _metrics(cash_flow, total_pnl, starting_cash):
+    equity_curve = cash_flow.cumsum() + starting_cash
     returns = equity_curve.diff().fillna(0)
     sharpe = returns.mean() / returns.std() * (252**0.5)
     max_dd = (equity_curve - equity_curve.cummax()).min()
 
-    metrics_dict = {
-        "total_return": summary["total_pnl"] / starting_cash,
+    return {
+        "total_return": total_pnl / starting_cash,
         "max_drawdown": max_dd,
         "sharpe_ratio": sharpe
     }
 
-    return df, trades_list, metrics_dict
-
 
@@ -0,0 +1,123 @@
+# Vectorized execution
+import numpy as np
+import pandas as pd
+from order import Order, next_order_id
+import instrumentation
+
+EXECUTION_MODES = ("event", "vectorized")
+
+
+def check_mode(mode):
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"mode must be one of {EXECUTION_MODES}, got {mode!r}")
+
+
+def vectorized_fills(symbol, timestamps, signal, price, qty, leg_sign=1):
+    """
+    The fills the event-driven path produces when every non-zero signal is
+    filled by the book's default bar liquidity at the bar's price: one
+    fill of `qty` per signal bar, buying on +1 and selling on -1 (flipped by
+    leg_sign=-1 for the hedge leg of a pair).
+
+    Returns one row per fill with the execution report fields
+    (timestamp, symbol, side, filled_qty, price, status) plus cash_flow,
+    the running position and the bar position of the fill.
+    """
+    signal = np.asarray(signal).reshape(-1)
+    price  = np.asarray(price, dtype=float).reshape(-1)
+    bars   = np.flatnonzero(signal)
+    sign   = np.sign(signal[bars]).astype(np.int64) * leg_sign
+    delta  = sign * qty
+    fill_price = price[bars]
+
+    return pd.DataFrame({
+        "timestamp":  pd.DatetimeIndex(timestamps)[bars],
+        "symbol":     symbol,
+        "side":       np.where(sign > 0, "buy", "sell"),
+        "filled_qty": qty,
+        "price":      fill_price,
+        "status":     "filled",
+        "cash_flow":  -delta * fill_price,
+        "position":   np.cumsum(delta),
+        "bar":        bars,
+    })
+
+
+def merge_legs(*legs):
+    """
+    Interleave per-leg fills bar by bar, keeping leg order within a bar
+    (the order the event path books them in).
+    """
+    trades = pd.concat(legs, ignore_index=True)
+    order = np.argsort(trades["bar"].to_numpy(), kind="stable")
+    return trades.iloc[order].reset_index(drop=True)
+
+
+def vectorized_pnl(trades, last_prices):
+    """
+    Total PnL: net cash flow plus the final position in each symbol
+    marked at `last_prices[symbol]`.
+    """
+    total = float(trades["cash_flow"].sum())
+    if len(trades):
+        final_pos = trades.groupby("symbol", sort=False)["position"].last()
+        for sym, pos in final_pos.items():
+            total += pos * last_prices[sym]
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Event-driven execution: the per-bar loop shared by the strategies'
+# mode="event" and the streaming engine. `legs` is a list of
+# (symbol, leg_sign, price, volume), one per symbol traded on the bar, and
+# the OMS's matching engine is a BookRouter.
+
+def fill_bar(oms, legs):
+    """
+    Start a new bar in every leg's book and apply the reports to the OMS.
+    The bar is the counterparty: every bar reaches the books, so a resting
+    limit remainder fills as soon as a bar's quote crosses it. Returns the
+    reports with a fill.
+    """
+    reports = []
+    for symbol, _, price, volume in legs:
+        reports += oms.matching_engine.set_bar(symbol, price, volume)
+    if reports:
+        oms.process_reports(reports)
+    return _filled(reports)
+
+
+def send_orders(oms, legs, direction, risk_params, timestamp):
+    """
+    Send one order of risk_params.order_size per leg, buying where
+    direction * leg_sign > 0 and selling otherwise (limit orders are
+    priced at the leg's bar price). The strategy's working orders on the
+    other side of each leg are canceled first, since they would trade with
+    the new ones. Returns the reports with a fill.
+    """
+    t0 = instrumentation.now() if instrumentation.enabled else 0
+    market = risk_params.order_type == "market"
+    orders = []
+    for symbol, leg_sign, price, _ in legs:
+        buy = direction * leg_sign > 0
+        oms.cancel_all(symbol, side="sell" if buy else "buy")
+        orders.append(Order(
+            id=next_order_id(),
+            symbol=symbol,
+            side="buy" if buy else "sell",
+            quantity=risk_params.order_size,
+            type=risk_params.order_type,
+            price=None if market else price,
+            timestamp=timestamp
+        ))
+    if t0:
+        instrumentation.record("strategy.orders", t0)
+    reports = []
+    for order in orders:
+        reports += oms.new_order(order)["reports"]
+    return _filled(reports)
+
+
+def _filled(reports):
+    # (an unfilled market remainder comes back as a canceled report)
+    return [rpt for rpt in reports if rpt["filled_qty"]]
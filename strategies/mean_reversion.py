@@ -4,7 +4,6 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
 import pandas as pd
-import uuid
 from datetime import datetime
 
 import sys
@@ -12,103 +11,95 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
-from order import Order
 from order import risk_params
 from oms import OrderManagementSystem
-from order_book import LimitOrderBook
+from book_router import BookRouter
+from order_book import BarLiquidity
 from position_tracker import PositionTracker
+from clock import SimulationClock
 from market_data_loader import MarketDataLoader
-
-def run_backtest(symbol, market_loader, risk_params, bollinger_win=20, num_std=2.0):
+from strategies.signals import band_cross
+from indicators import default_cache
+from strategies.execution import check_mode, fill_bar, send_orders, vectorized_fills, vectorized_pnl
+import instrumentation
+
+def run_backtest(symbol, market_loader, risk_params, bollinger_win=20, num_std=2.0, mode="event",
+                 liquidity=None):
+    """
+    mode="event" routes every signal through the OMS and order book and
+    returns trades as a list of execution reports. mode="vectorized" fills
+    each signal at the bar's last_price straight from the arrays (same
+    trades and metrics) and returns trades as a DataFrame.
+
+    In event mode orders fill against the bar (set_bar) under
+    `liquidity`, a BarLiquidity; the default fills everything at
+    last_price, which is what the vectorized mode assumes.
+    """
+    check_mode(mode)
     history = market_loader.get_history(symbol)
+    t0 = instrumentation.now() if instrumentation.enabled else 0
     signals_df = pd.DataFrame(index=history.index)
     signals_df["timestamp"] = history.index
 
-    # Compute Bollinger Bands
-    rolling_mean = history["last_price"].rolling(bollinger_win).mean()
-    rolling_std  = history["last_price"].rolling(bollinger_win).std()
-    history["upper"] = rolling_mean + num_std * rolling_std
-    history["lower"] = rolling_mean - num_std * rolling_std
-    history["mid"]   = rolling_mean
+    # Compute Bollinger Bands (rolling stats from the shared indicator cache)
+    rolling_mean = default_cache.rolling_mean(symbol, history["last_price"], bollinger_win)
+    rolling_std  = default_cache.rolling_std(symbol, history["last_price"], bollinger_win)
+    upper = rolling_mean + num_std * rolling_std
+    lower = rolling_mean - num_std * rolling_std
 
     # Generate Signals
-    prev_price = history["last_price"].shift(1)
-    prev_upper = history["upper"].shift(1)
-    prev_lower = history["lower"].shift(1)
-    prev_mid   = history["mid"].shift(1)
-    
-    signals_df["signal"] = 0
-
-    # Long Entry: crossed below lower band
-    long_entry = (prev_price > prev_lower) & (history["last_price"] < history["lower"])
-    # Short Entry: crossed above upper band
-    short_entry = (prev_price < prev_upper) & (history["last_price"] > history["upper"])
-    # Exit to Mid
-    exit_pos = (prev_price < prev_mid) & (history["last_price"] > history["mid"]) | \
-               (prev_price > prev_mid) & (history["last_price"] < history["mid"])
-
-    signals_df.loc[long_entry, "signal"]  = 1
-    signals_df.loc[short_entry, "signal"] = -1
-    signals_df.loc[exit_pos, "signal"]    = 0
-
-    oms     = OrderManagementSystem()
-    book    = LimitOrderBook(symbol)
-    tracker = PositionTracker(starting_cash=1_000_000.0)
-    trades_list = []
+    # Long entry: crossed below lower band; short entry: crossed above
+    # upper band; crossing the mid line is an exit
+    signals_df["signal"] = band_cross(history["last_price"], lower, upper, rolling_mean)
+    if t0:
+        instrumentation.record("strategy.signals", t0)
+
+    last_price = history["last_price"].iloc[-1]
 
-    for _, row in signals_df.iterrows():
-        sig = row["signal"]
-        if sig == 0:
-            continue
-
-        price = None if risk_params.order_type == "market" else float(history.loc[row["timestamp"], "last_price"])
-
-        order = Order(
-            id=str(uuid.uuid4()),
-            symbol=symbol,
-            side="buy" if sig > 0 else "sell",
-            quantity=risk_params.order_size,
-            type=risk_params.order_type,
-            price=price,
-            timestamp=row["timestamp"]
-        )
-
-        # Add fake counterparty to ensure execution
-        counter_order = Order(
-            id=f"FAKE-{uuid.uuid4()}",
-            symbol=symbol,
-            side="buy" if sig < 0 else "sell",
-            quantity=risk_params.order_size,
-            type="limit",
-            price=float(history.loc[row["timestamp"], "last_price"]),
-            timestamp=row["timestamp"]
-        )
-
-        oms.new_order(counter_order)
-        oms.new_order(order)
-
-        book.add_order(counter_order)
-        reports = book.add_order(order)
+    if mode == "vectorized":
+        trades_df = vectorized_fills(symbol, history.index, signals_df["signal"],
+                                     history["last_price"], risk_params.order_size)
+        total_pnl = vectorized_pnl(trades_df, {symbol: last_price})
+        ending_cash = 1_000_000.0 + trades_df["cash_flow"].sum()
+        metrics_dict = _metrics(trades_df["cash_flow"], total_pnl, ending_cash)
+        return signals_df, trades_df, metrics_dict
+
+    # OMS, book and tracker share one clock that follows the bars
+    clock   = SimulationClock()
+    router  = BookRouter(clock=clock, liquidity=liquidity or BarLiquidity())
+    oms     = OrderManagementSystem(matching_engine=router, clock=clock)
+    tracker = PositionTracker(starting_cash=1_000_000.0, clock=clock)
+    trades_list = []
 
+    bar_prices  = history["last_price"].to_numpy(dtype=float)
+    bar_volumes = history["volume"].to_numpy(dtype=float)
+    for ts, sig, bar_price, bar_volume in zip(signals_df["timestamp"], signals_df["signal"],
+                                              bar_prices.tolist(), bar_volumes.tolist()):
+        clock.set(ts)
+        legs = [(symbol, 1, bar_price, bar_volume)]
+        reports = fill_bar(oms, legs)
+        if sig != 0:
+            reports += send_orders(oms, legs, sig, risk_params, ts)
         for rpt in reports:
-            if str(rpt["order_id"]).startswith("FAKE"):
-                continue
             tracker.update(rpt)
-            trades_list.append(rpt.copy())
+            trades_list.append(rpt)
 
-    last_price = history["last_price"].iloc[-1]
     summary = tracker.get_pnl_summary(current_prices={symbol: last_price})
     blotter_df = tracker.get_blotter()
-    equity_curve = blotter_df["cash_flow"].cumsum() + tracker.cash
+    metrics_dict = _metrics(blotter_df["cash_flow"], summary["total_pnl"], tracker.cash)
+
+    return signals_df, trades_list, metrics_dict
+
+
+def _metrics(cash_flow, total_pnl, ending_cash):
+    equity_curve = cash_flow.cumsum() + ending_cash
     returns = equity_curve.diff().fillna(0)
     sharpe  = returns.mean() / (returns.std() + 1e-9) * (252**0.5)
     max_dd  = (equity_curve - equity_curve.cummax()).min()
 
-    metrics_dict = {
-        "total_return": summary["total_pnl"] / 1_000_000.0,
+    return {
+        "total_return": total_pnl / 1_000_000.0,
         "max_drawdown": max_dd,
         "sharpe_ratio": sharpe
     }
 
-    return signals_df, trades_list, metrics_dict
-
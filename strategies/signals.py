@@ -0,0 +1,63 @@
+# Signal kernels
+import numpy as np
+
+
+def _as_float(x):
+    return np.asarray(x, dtype=float).reshape(-1)
+
+
+def _prev(x):
+    """
+    x shifted forward by one bar (NaN on the first bar), like Series.shift(1).
+    """
+    out = np.empty_like(x)
+    out[0:1] = np.nan
+    out[1:] = x[:-1]
+    return out
+
+
+def crossover(fast, slow):
+    """
+    +1 on bars where `fast` crosses above `slow`, -1 where it crosses
+    below, 0 elsewhere. A cross needs a strict inequality on both the
+    previous and the current bar; NaNs never cross.
+    """
+    fast, slow = _as_float(fast), _as_float(slow)
+    prev_fast, prev_slow = _prev(fast), _prev(slow)
+    up   = (prev_fast < prev_slow) & (fast > slow)
+    down = (prev_fast > prev_slow) & (fast < slow)
+    return np.select([up, down], [1, -1], 0)
+
+
+def band_cross(price, lower, upper, mid):
+    """
+    Bollinger-style entries and exits:
+      +1 when price crosses below the lower band (long entry)
+      -1 when price crosses above the upper band (short entry)
+       0 when price crosses the mid line in either direction (exit),
+         which takes precedence over an entry on the same bar
+    """
+    price, lower, upper, mid = (_as_float(a) for a in (price, lower, upper, mid))
+    prev_price = _prev(price)
+    prev_lower, prev_upper, prev_mid = _prev(lower), _prev(upper), _prev(mid)
+
+    long_entry  = (prev_price > prev_lower) & (price < lower)
+    short_entry = (prev_price < prev_upper) & (price > upper)
+    exit_pos    = (prev_price < prev_mid) & (price > mid) | \
+                  (prev_price > prev_mid) & (price < mid)
+    return np.select([exit_pos, short_entry, long_entry], [0, -1, 1], 0)
+
+
+def threshold_cross(x, threshold):
+    """
+    Spread-style signals around a symmetric +/- threshold:
+      -1 when x crosses above +threshold (short the spread)
+      +1 when x crosses below -threshold (long the spread)
+       0 otherwise (including crossing back inside the band)
+    An upward cross wins if both happen on one bar.
+    """
+    x = _as_float(x)
+    prev = _prev(x)
+    short = (prev < threshold) & (x > threshold)
+    long_ = (prev > -threshold) & (x < -threshold)
+    return np.select([short, long_], [-1, 1], 0)
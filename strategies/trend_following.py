@@ -4,7 +4,6 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
 import pandas as pd
-import uuid
 from datetime import datetime
 
 import sys
@@ -12,101 +11,93 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
-from order import Order
 from order import risk_params
 from oms import OrderManagementSystem
-from order_book import LimitOrderBook
+from book_router import BookRouter
+from order_book import BarLiquidity
 from position_tracker import PositionTracker
+from clock import SimulationClock
 from market_data_loader import MarketDataLoader
+from strategies.signals import crossover
+from indicators import default_cache
+from strategies.execution import check_mode, fill_bar, send_orders, vectorized_fills, vectorized_pnl
+import instrumentation
 
 
-def run_backtest(symbol, market_loader, risk_params, short_win=5, long_win=25):
-    
+def run_backtest(symbol, market_loader, risk_params, short_win=5, long_win=25, mode="event",
+                 liquidity=None):
+    """
+    mode="event" routes every signal through the OMS and order book and
+    returns trades as a list of execution reports. mode="vectorized" fills
+    each signal at the bar's last_price straight from the arrays (same
+    trades and metrics) and returns trades as a DataFrame.
+
+    In event mode orders fill against the bar (set_bar) under
+    `liquidity`, a BarLiquidity; the default fills everything at
+    last_price, which is what the vectorized mode assumes.
+    """
+    check_mode(mode)
     history = market_loader.get_history(symbol)
+    t0 = instrumentation.now() if instrumentation.enabled else 0
     signals_df = pd.DataFrame(index=history.index)
     signals_df['timestamp'] = history.index
     
-    history["ma_short"] = history["last_price"].rolling(short_win).mean()
-    history["ma_long"]  = history["last_price"].rolling(long_win).mean()
-    signals_df['signal'] = 0
+    # Moving averages come from the shared indicator cache (prefix sums),
+    # so sweeping windows over the same series doesn't re-scan it
+    last_price = history["last_price"].squeeze() 
+    ma_short = default_cache.rolling_mean(symbol, last_price, short_win)
+    ma_long  = default_cache.rolling_mean(symbol, last_price, long_win)
+
+    # +1 when the short MA crosses above the long MA, -1 when it crosses below
+    signals_df['signal'] = crossover(ma_short, ma_long)
+    if t0:
+        instrumentation.record("strategy.signals", t0)
 
-    ma_short = history["ma_short"]
-    ma_long = history["ma_long"]
-    
-    for i in range(1, len(ma_short)):
-        if ma_short[i-1] <  ma_long[i-1] and ma_short[i] > ma_long[i]:
-            signals_df.loc[signals_df.index[i], "signal"] = 1
-        elif ma_short[i-1] > ma_long[i-1] and ma_short[i] < ma_long[i]:
-            signals_df.loc[signals_df.index[i], "signal"] = -1
-        else:
-            signals_df.loc[signals_df.index[i], "signal"] = 0
-
-    oms = OrderManagementSystem()
-    book = LimitOrderBook(symbol)
     ###
     starting_cash_var = 1000000.0
     ###
-    tracker = PositionTracker(starting_cash = starting_cash_var)
+
+    if mode == "vectorized":
+        trades_df = vectorized_fills(symbol, history.index, signals_df["signal"],
+                                     last_price, risk_params.order_size)
+        total_pnl = vectorized_pnl(trades_df, {symbol: last_price.iloc[-1]})
+        metrics_dict = _metrics(trades_df["cash_flow"], total_pnl, starting_cash_var)
+        return signals_df, trades_df, metrics_dict
+
+    # OMS, book and tracker share one clock that follows the bars
+    clock = SimulationClock()
+    router = BookRouter(clock=clock, liquidity=liquidity or BarLiquidity())
+    oms = OrderManagementSystem(matching_engine=router, clock=clock)
+    tracker = PositionTracker(starting_cash = starting_cash_var, clock=clock)
     trades_list = []
 
     
-    for _, row in signals_df.iterrows():
-        sig = row['signal']
-        if sig == 0:
-            continue
-
-        order = Order(
-            id=str(uuid.uuid4()),
-            symbol=symbol,
-            side="buy" if sig > 0 else "sell",
-            quantity=risk_params.order_size,
-            type=risk_params.order_type,
-            price=None if risk_params.order_type == "market" else float(history.loc[row['timestamp'], 'last_price'].squeeze()),
-            timestamp=row['timestamp']
-        )
-        
-
-        """
-        WE MUST CREATE A COUNTERPARTY TO EVERY ORDER WE MAKE OR WE JUST SET UP A BUNCH OF UNFULFILLED ORDERS
-        Ignore the order details though, it's just trash imaginary trades based on the historic price.
-        """
-        counter_order = Order(
-            id=str(uuid.uuid4()),
-            symbol=symbol,
-            side="buy" if sig < 0 else "sell",
-            quantity=risk_params.order_size,
-            type="limit",
-            price= float(history.loc[row['timestamp'], 'last_price'].squeeze()),
-            timestamp=row['timestamp']
-        )
-        ###CHAT GPT SUGGESTED, CORRECTING COUNTER ORDERS GETTING PROCESSED IN TRACKER###
-        counter_order.id = f"FAKE-{uuid.uuid4()}"
-        ##########
-        
-        ack2 = oms.new_order(counter_order)
-        ack = oms.new_order(order)
-        book.add_order(counter_order)
-        reports = book.add_order(order)
-
-        
+    bar_prices = last_price.to_numpy(dtype=float)
+    bar_volumes = history["volume"].squeeze().to_numpy(dtype=float)
+    for ts, sig, bar_price, bar_volume in zip(signals_df['timestamp'], signals_df['signal'],
+                                              bar_prices.tolist(), bar_volumes.tolist()):
+        clock.set(ts)
+        legs = [(symbol, 1, bar_price, bar_volume)]
+        reports = fill_bar(oms, legs)
+        if sig != 0:
+            reports += send_orders(oms, legs, sig, risk_params, ts)
         for rpt in reports:
-            #PART 2 OF CORRECTING COUNTER ORDERS
-            if str(rpt["order_id"]).startswith("FAKE"):
-                continue 
-            #####
             tracker.update(rpt)
             trades_list.append(rpt)
-    last_price = history["last_price"].squeeze() 
     summary = tracker.get_pnl_summary(current_prices={symbol: last_price.iloc[-1]})
     blotter_df = tracker.get_blotter()
-    equity_curve = blotter_df["cash_flow"].cumsum() + starting_cash_var
+    metrics_dict = _metrics(blotter_df["cash_flow"], summary["total_pnl"], starting_cash_var)
+    return signals_df, trades_list, metrics_dict
+
+
+def _metrics(cash_flow, total_pnl, starting_cash_var):
+    equity_curve = cash_flow.cumsum() + starting_cash_var
     returns = equity_curve.diff().fillna(0)
     sharpe  = returns.mean() / returns.std() * (252**0.5)
     max_dd  = (equity_curve - equity_curve.cummax()).min()
-    metrics_dict = {
-        "total_return": (summary["total_pnl"] / starting_cash_var),
+    return {
+        "total_return": (total_pnl / starting_cash_var),
         "max_drawdown": max_dd,    # compute from tracker.blotter or equity curve
         "sharpe_ratio": sharpe     # compute returns.std() etc.
     }
-    return signals_df, trades_list, metrics_dict
 
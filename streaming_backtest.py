@@ -0,0 +1,294 @@
+"""
+Streaming bar-by-bar backtests with bounded memory
+"""
+import math
+
+from oms import OrderManagementSystem
+from book_router import BookRouter
+from order_book import BarLiquidity
+from position_tracker import PositionTracker
+from clock import SimulationClock
+from indicators import RollingMean, RollingStd, RunningStats, OnlineOLS
+from strategies.execution import fill_bar, send_orders
+import instrumentation
+
+
+def _bars(chunks):
+    """
+    Flatten a stream of bar frames into (timestamp ns, last_price, volume)
+    tuples.
+    """
+    for chunk in chunks:
+        ts = chunk.index.as_unit("ns").asi8
+        prices = chunk["last_price"].to_numpy(dtype=float)
+        volumes = chunk["volume"].to_numpy(dtype=float)
+        yield from zip(ts.tolist(), prices.tolist(), volumes.tolist())
+
+
+def iter_bars(loader, symbols, chunk_size=10_000):
+    """
+    Yield (timestamp ns, (price, ...), (volume, ...)) for every bar,
+    pulling chunk_size bars at a time per symbol from loader.iter_history().
+
+    With several symbols only timestamps present in all of them are
+    yielded, skipping bars where any price is NaN (the same rows the batch
+    pair strategy keeps after aligning and dropna()).
+    """
+    streams = [_bars(loader.iter_history(symbol, chunk_size)) for symbol in symbols]
+    if len(streams) == 1:
+        for ts, price, volume in streams[0]:
+            yield ts, (price,), (volume,)
+        return
+
+    heads = [next(stream, None) for stream in streams]
+    while all(head is not None for head in heads):
+        ts = max(head[0] for head in heads)
+        for i, stream in enumerate(streams):
+            while heads[i] is not None and heads[i][0] < ts:
+                heads[i] = next(stream, None)
+        if any(head is None for head in heads):
+            return
+        if all(head[0] == ts for head in heads):
+            prices = tuple(head[1] for head in heads)
+            if all(p == p for p in prices):
+                yield ts, prices, tuple(head[2] for head in heads)
+            heads = [next(stream, None) for stream in streams]
+
+
+# ---------------------------------------------------------------------------
+# Strategies. Each one lists the symbols it trades and the side of each leg
+# relative to its signal, and turns one bar of prices into a signal
+# (+1 buy, -1 sell, 0 nothing) using online indicators only.
+
+class TrendFollowingStream:
+    """
+    Moving-average crossover (strategies/trend_following.py, bar by bar).
+    """
+    def __init__(self, symbol, short_win=5, long_win=25):
+        self.symbols = [symbol]
+        self.leg_signs = (1,)
+        self._short = RollingMean(short_win)
+        self._long = RollingMean(long_win)
+        self._prev = (math.nan, math.nan)
+
+    def on_bar(self, prices):
+        price = prices[0]
+        fast, slow = self._short.update(price), self._long.update(price)
+        prev_fast, prev_slow = self._prev
+        self._prev = (fast, slow)
+        if prev_fast < prev_slow and fast > slow:
+            return 1
+        if prev_fast > prev_slow and fast < slow:
+            return -1
+        return 0
+
+
+class MeanReversionStream:
+    """
+    Bollinger band entries/exits (strategies/mean_reversion.py, bar by bar).
+    """
+    def __init__(self, symbol, bollinger_win=20, num_std=2.0):
+        self.symbols = [symbol]
+        self.leg_signs = (1,)
+        self.num_std = num_std
+        self._stats = RollingStd(bollinger_win)
+        # previous bar's (price, lower, upper, mid)
+        self._prev = (math.nan,) * 4
+
+    def on_bar(self, prices):
+        price = prices[0]
+        std = self._stats.update(price)
+        mid = self._stats.mean
+        lower, upper = mid - self.num_std * std, mid + self.num_std * std
+        prev_price, prev_lower, prev_upper, prev_mid = self._prev
+        self._prev = (price, lower, upper, mid)
+        # exits take precedence over entries on the same bar
+        if (prev_price < prev_mid and price > mid) or (prev_price > prev_mid and price < mid):
+            return 0
+        if prev_price < prev_upper and price > upper:
+            return -1
+        if prev_price > prev_lower and price < lower:
+            return 1
+        return 0
+
+
+class PairSpreadStream:
+    """
+    Spread threshold strategy (strategies/arbitrage.py, bar by bar). Long
+    symbol1 / short symbol2 on +1 and the reverse on -1.
+
+    The batch version fits the hedge ratio on the whole history up front;
+    here it is an expanding OLS of symbol1 on symbol2 over the bars seen so
+    far (no look-ahead), and no signals are taken before `min_periods`
+    bars. Pass `beta` to fix the hedge ratio instead.
+    """
+    def __init__(self, symbol1, symbol2, threshold=2.0, beta=None, min_periods=30):
+        self.symbols = [symbol1, symbol2]
+        self.leg_signs = (1, -1)
+        self.threshold = threshold
+        self.beta = beta
+        self.min_periods = min_periods
+        self._ols = OnlineOLS()
+        self._prev = math.nan
+
+    def on_bar(self, prices):
+        p1, p2 = prices
+        beta = self.beta
+        if beta is None:
+            beta = self._ols.update(p2, p1)
+            if self._ols.n < self.min_periods:
+                beta = math.nan
+        spread = p1 - beta * p2
+        prev, self._prev = self._prev, spread
+        if prev < self.threshold and spread > self.threshold:
+            return -1
+        if prev > -self.threshold and spread < -self.threshold:
+            return 1
+        return 0
+
+
+class OnlineMetrics:
+    """
+    The strategies' _metrics() computed fill by fill: the equity curve is
+    cash after each fill, returns are its changes (0 for the first fill),
+    Sharpe is mean/std of those returns * sqrt(252) and max drawdown is
+    the worst drop from the running peak.
+    """
+    def __init__(self, starting_cash):
+        self.starting_cash = starting_cash
+        self.returns = RunningStats()
+        self._equity = None
+        self._peak = -math.inf
+        self.max_drawdown = math.nan
+
+    def update(self, equity):
+        self.returns.update(0.0 if self._equity is None else equity - self._equity)
+        self._equity = equity
+        self._peak = max(self._peak, equity)
+        drawdown = equity - self._peak
+        if not drawdown >= self.max_drawdown:
+            self.max_drawdown = drawdown
+
+    def result(self, total_pnl):
+        std = self.returns.std
+        return {
+            "total_return": total_pnl / self.starting_cash,
+            "max_drawdown": self.max_drawdown,
+            "sharpe_ratio": self.returns.mean / std * (252**0.5) if std > 0 else math.nan,
+        }
+
+
+class StreamingBacktest:
+    """
+    Runs a streaming strategy over history pulled chunk by chunk from a
+    MarketDataLoader (loader.iter_history). Every signal goes through the
+    OMS and the symbol's order book, which fills it against the bar's
+    price and volume under `liquidity` (a BarLiquidity; the default fills
+    everything at the bar price) the same way the event-driven
+    run_backtest does, and each fill is booked to the PositionTracker as
+    it happens.
+
+    Memory is bounded by chunk_size and the indicator windows, not by the
+    length of the history: filled orders go to the OMS's bounded archive,
+    the tracker keeps no blotter unless keep_blotter=True, and metrics
+    are accumulated online.
+
+    With enforce_limits=True a signal is skipped (and counted in
+    `rejected`) if any leg would take the position beyond
+    risk_params.max_pos shares either way, or if its net purchases would
+    cost more than the cash on hand.
+
+        bt = StreamingBacktest(TrendFollowingStream("AAPL", 5, 25), loader, risk_params)
+        metrics = bt.run()
+    """
+    def __init__(self, strategy, loader, risk_params, chunk_size=10_000,
+                 starting_cash=1_000_000.0, keep_blotter=False, enforce_limits=False,
+                 liquidity=None):
+        self.strategy = strategy
+        self.loader = loader
+        self.risk_params = risk_params
+        self.chunk_size = chunk_size
+        self.enforce_limits = enforce_limits
+        self.rejected = 0
+        # set to each bar's time, so orders and fills carry the bar time
+        self.clock = SimulationClock()
+        self.router = BookRouter(clock=self.clock, liquidity=liquidity or BarLiquidity())
+        self.oms = OrderManagementSystem(matching_engine=self.router, clock=self.clock)
+        self.tracker = PositionTracker(starting_cash=starting_cash, keep_blotter=keep_blotter,
+                                       clock=self.clock)
+        self.metrics = OnlineMetrics(starting_cash)
+        self.bars = 0
+        self._last = ()
+        self._legs = list(zip(strategy.symbols, strategy.leg_signs))
+
+    def fills(self):
+        """
+        Generator over the run: advances bar by bar and yields each
+        execution report after it has been booked to the tracker.
+        """
+        for ts, prices, volumes in iter_bars(self.loader, self.strategy.symbols, self.chunk_size):
+            yield from self.step(ts, prices, volumes)
+
+    def step(self, ts, prices, volumes=None):
+        """
+        Process one bar (timestamp ns, the strategy symbols' prices and
+        volumes) and return the execution reports it booked. This is the
+        whole per-bar loop, so bars can also be pushed in from elsewhere
+        (e.g. replay_feed's async consumers) instead of run().
+        """
+        strategy = self.strategy
+        self.bars += 1
+        self._last = prices
+        self.clock.set(ts)
+        if volumes is None:
+            volumes = (None,) * len(prices)
+        legs = [(symbol, leg_sign, price, volume)
+                for (symbol, leg_sign), price, volume in zip(self._legs, prices, volumes)]
+        booked = fill_bar(self.oms, legs)
+        self._book(booked)
+        t0 = instrumentation.now() if instrumentation.enabled else 0
+        sig = strategy.on_bar(prices)
+        if t0:
+            instrumentation.record("strategy.signals", t0)
+        if sig == 0:
+            return booked
+        if self.enforce_limits and not self._within_limits(self._legs, sig, prices):
+            self.rejected += 1
+            return booked
+        reports = send_orders(self.oms, legs, sig, self.risk_params, self.clock.now())
+        self._book(reports)
+        return booked + reports
+
+    def _book(self, reports):
+        for rpt in reports:
+            self.tracker.update(rpt)
+            self.metrics.update(self.tracker.cash)
+
+    def _within_limits(self, legs, sig, prices):
+        qty = self.risk_params.order_size
+        max_pos = self.risk_params.max_pos
+        positions = self.tracker.positions
+        cost = 0.0
+        for (symbol, leg_sign), price in zip(legs, prices):
+            delta = sig * leg_sign * qty
+            if max_pos is not None and abs(positions.get(symbol, 0) + delta) > max_pos:
+                return False
+            cost += delta * price
+        return cost <= self.tracker.cash
+
+    def run(self):
+        """
+        Consume the whole stream and return the metrics dict
+        (total_return, max_drawdown, sharpe_ratio).
+        """
+        for _ in self.fills():
+            pass
+        return self.result()
+
+    @property
+    def last_prices(self):
+        return dict(zip(self.strategy.symbols, self._last))
+
+    def result(self):
+        summary = self.tracker.get_pnl_summary(current_prices=self.last_prices)
+        return self.metrics.result(summary["total_pnl"])
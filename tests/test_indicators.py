@@ -0,0 +1,26 @@
+"""
+IndicatorCache must never hand back indicators of a different series.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from indicators import IndicatorCache
+
+
+def test_cache_sees_edits_inside_the_series():
+    cache = IndicatorCache()
+    index = pd.date_range("2024-01-01", periods=2_000, freq="5min", tz="UTC")
+    prices = pd.Series(100 + np.random.default_rng(0).normal(0, 1, len(index)).cumsum(),
+                       index=index)
+    cache.rolling_mean("AAA", prices, 20)
+    # same symbol, dates, length and last bar; one bar corrected mid-series
+    edited = prices.copy()
+    edited.iloc[1000] -= 50.0
+    got = cache.rolling_mean("AAA", edited, 20)
+    expected = edited.rolling(20).mean().to_numpy()
+    assert np.allclose(got, expected, equal_nan=True)
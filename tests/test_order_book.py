@@ -0,0 +1,77 @@
+"""
+LimitOrderBook and OMS edge cases.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from order import Order
+from order_book import LimitOrderBook
+from oms import OrderManagementSystem
+from book_router import BookRouter
+
+
+def test_book_rejects_duplicate_resting_id():
+    book = LimitOrderBook("X")
+    book.add_order(Order("dup", "X", "sell", 10, "limit", 100.0))
+    with pytest.raises(ValueError):
+        book.add_order(Order("dup", "X", "sell", 20, "limit", 101.0))
+    with pytest.raises(ValueError):
+        book.add_order(Order("dup", "X", "buy", 5, "stop", 105.0))
+    # the first order is untouched and the book still drains
+    reports = book.add_order(Order("m", "X", "buy", 30, "market"))
+    assert [(r["order_id"], r["filled_qty"], r["status"]) for r in reports] == [
+        ("m", 10, "partial_fill"), ("dup", 10, "filled"), ("m", 0, "canceled")]
+    assert book.depth() == {"bids": [], "asks": []}
+
+
+def test_oms_rejects_duplicate_open_id():
+    oms = OrderManagementSystem(matching_engine=LimitOrderBook("X"))
+    oms.new_order(Order("dup", "X", "sell", 10, "limit", 100.0))
+    with pytest.raises(ValueError):
+        oms.new_order(Order("dup", "X", "sell", 20, "limit", 101.0))
+    assert oms.remaining("dup") == 10
+
+
+def test_cancel_too_late_leaves_order_to_poll():
+    router = BookRouter(workers=1)
+    oms = OrderManagementSystem(matching_engine=router)
+    try:
+        oms.submit_order(Order("s", "X", "sell", 10, "limit", 100.0))
+        oms.submit_order(Order("b", "X", "buy", 10, "limit", 100.0))
+        router.flush()   # the worker has matched both, unpolled
+        ack = oms.cancel_order("s")
+        assert ack["status"] == "accepted"
+        assert oms.status("s") == "accepted"
+        oms.poll()
+        assert oms.status("s") == "filled" and oms.remaining("s") == 0
+    finally:
+        router.close()
+
+
+def test_tick_book_never_moves_a_limit_to_a_worse_price():
+    book = LimitOrderBook("X", ticks_per_unit=100)
+    book.add_order(Order("a", "X", "sell", 10, "limit", 100.02))
+    # a buy limited at 100.016 can't take the 100.02 ask, and rests at 100.01
+    assert book.add_order(Order("b", "X", "buy", 5, "limit", 100.016)) == []
+    assert book.depth() == {"bids": [(100.01, 5)], "asks": [(100.02, 10)]}
+    # a sell limited at 100.014 rests at 100.02, never below its limit
+    assert book.add_order(Order("s", "X", "sell", 5, "limit", 100.014)) == []
+    assert book.depth()["asks"] == [(100.02, 15)]
+
+
+def test_level_changes_are_tracked_only_once_l2_is_read():
+    book = LimitOrderBook("X")
+    for i in range(100):
+        book.add_order(Order(f"s{i}", "X", "sell", 1, "limit", 100.0 + i))
+        book.add_order(Order(f"b{i}", "X", "buy", 1, "market"))
+    assert book._dirty_asks is None
+    book.add_order(Order("a", "X", "sell", 5, "limit", 101.0))
+    # the first diff is the whole book, relative to an empty one
+    assert book.diff()["asks"] == [(101.0, 5)]
+    book.cancel("a")
+    assert book.diff()["asks"] == [(101.0, 0)]
+    assert book.diff()["asks"] == []